@@ -6,6 +6,9 @@ from dash_iconify import DashIconify
 from dash_extensions import EventListener
 
 from assets.header import header
+from utils import process_data
+from utils.cache import all_caches
+from utils.profiling import instrument_app, reset_after_fork as reset_profiling_after_fork
 
 app = dash.Dash(
     __name__,
@@ -137,5 +140,35 @@ def update_nav_dots(pathname):
     return new_colors, new_widths
 
 
+instrument_app(app)
+
+
+def warm_up(figures=True):
+    """
+    Load every dataset and fill the figure caches (unless `figures` is False), e.g. in the gunicorn master before it
+    forks the workers (preload_app in gunicorn.conf.py): the workers then start with everything in memory, shared
+    copy-on-write.
+    """
+    # Already imported by dash.Dash(use_pages=True)
+    from pages import gdp, global_analysis, survey_analysis
+
+    process_data.warm_up()
+    global_analysis.warm_up()
+    if figures:
+        gdp.warm_up()
+        survey_analysis.warm_up()
+
+
+def reset_after_fork():
+    """
+    Re-initialize in a forked worker what must not be shared with the master: locks and profiling metrics
+    """
+    for cache in all_caches.values():
+        cache.reset_lock()
+    for disorder_df in process_data.all_disorders_dataframes.values():
+        disorder_df.reset_lock()
+    reset_profiling_after_fork()
+
+
 if __name__ == "__main__":
     app.run_server(debug=True)
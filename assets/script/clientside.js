@@ -1,3 +1,66 @@
+function decode_typed_array(base64, ArrayType) {
+    const bytes = Uint8Array.from(atob(base64), c => c.charCodeAt(0));
+    return new ArrayType(bytes.buffer);
+}
+
+// Rotation of the globe of the global analysis page: the projection of the choropleth is relaid out at each animation
+// frame, without going through the figure of dcc.Graph. Nothing runs while the tab is hidden, and the loop stops when
+// the page is left (toggle_globe_rotation starts it again).
+// The rotation is applied as a GUI edit, like a drag of the globe: with the constant uirevision of the figure, Plotly
+// keeps it when the callbacks update the figure. It emits plotly_update, which dcc.Graph does not listen to, instead
+// of plotly_relayout, which would set its relayoutData at every frame.
+const globe_rotation = {
+    degrees_per_second: 10,
+    running: false,
+    frame: null,
+    last_time: null,
+
+    start: function() {
+        globe_rotation.running = true;
+        if(globe_rotation.frame === null && !document.hidden) {
+            globe_rotation.last_time = null;
+            globe_rotation.frame = requestAnimationFrame(globe_rotation.step);
+        }
+    },
+    stop: function() {
+        globe_rotation.running = false;
+        if(globe_rotation.frame !== null) {
+            cancelAnimationFrame(globe_rotation.frame);
+            globe_rotation.frame = null;
+        }
+    },
+    step: function(time) {
+        globe_rotation.frame = null;
+        if(!document.getElementById('global-analysis-container')) {
+            globe_rotation.running = false;
+            return;
+        }
+
+        const graph = document.getElementById('choropleth-fig');
+        const gd = graph && graph.querySelector('.js-plotly-plot');
+        if(gd && gd.layout && gd.layout.geo && globe_rotation.last_time !== null) {
+            const rotation = gd.layout.geo.projection.rotation;
+            let lon = rotation.lon + globe_rotation.degrees_per_second * (time - globe_rotation.last_time) / 1000;
+            if(lon >= 180) {
+                lon -= 360;
+            }
+            (Plotly._guiUpdate || Plotly.update)(gd, {}, {'geo.projection.rotation.lon': lon});
+        }
+        globe_rotation.last_time = time;
+        globe_rotation.frame = requestAnimationFrame(globe_rotation.step);
+    }
+};
+
+document.addEventListener('visibilitychange', function() {
+    if(document.hidden) {
+        const running = globe_rotation.running;
+        globe_rotation.stop();
+        globe_rotation.running = running;
+    } else if(globe_rotation.running) {
+        globe_rotation.start();
+    }
+});
+
 window.dash_clientside = Object.assign({}, window.dash_clientside, {
     clientside: {
         toggle_modal_heatmap: function(n_clicks, opened) {
@@ -12,11 +75,14 @@ window.dash_clientside = Object.assign({}, window.dash_clientside, {
             }
             return !opened;
         },
-        stop_animate_choropleth: function(n_clicks) {
-            if(n_clicks === undefined) {
-                return window.dash_clientside.no_update;
+        toggle_globe_rotation: function(n_clicks) {
+            const running = !(n_clicks % 2);
+            if(running) {
+                globe_rotation.start();
+            } else {
+                globe_rotation.stop();
             }
-            return n_clicks % 2 ? 0 : -1;
+            return running;
         },
         toggle_modal_data_source: function(n_clicks, opened) {
             if(n_clicks === undefined) {
@@ -28,7 +94,66 @@ window.dash_clientside = Object.assign({}, window.dash_clientside, {
             return checked;
         },
         update_estimate_animation: function(data) {
+            // The estimate is no longer re-rendered on hover: restart the animation of the element itself
+            const group = document.getElementById('group-estimate');
+            if(data && group) {
+                group.classList.remove('animate__pulse');
+                void group.offsetWidth;
+                group.classList.add('animate__pulse');
+            }
             return "animate__animated animate__pulse";
+        },
+        update_choropleth_year_range: function(year_range, cube, _, figure) {
+            // Same averages as PrevalenceCube.get_average, from the cube sent by update_choropleth_cube
+            if(!Array.isArray(year_range) || !cube || !figure) {
+                return window.dash_clientside.no_update;
+            }
+            const values = decode_typed_array(cube.values, Float32Array);
+            const rows = decode_typed_array(cube.rows, Uint8Array);
+            const n_years = cube.years.length;
+            const i_start = cube.years.findIndex(year => year >= year_range[0]);
+            const i_end = cube.years.findIndex(year => year > year_range[1]);
+            const start = i_start === -1 ? n_years : i_start;
+            const end = i_end === -1 ? n_years : i_end;
+
+            const locations = [], customdata = [], z = [];
+            for(let i = 0; i < cube.codes.length; i++) {
+                let row_count = 0, value_count = 0, sum = 0;
+                for(let j = i * n_years + start; j < i * n_years + end; j++) {
+                    row_count += rows[j];
+                    if(!Number.isNaN(values[j])) {
+                        sum += values[j];
+                        value_count++;
+                    }
+                }
+                if(row_count > 0) {
+                    locations.push(cube.codes[i]);
+                    customdata.push([cube.entities[i], cube.continents[i]]);
+                    z.push(value_count > 0 ? sum / value_count : null);
+                }
+            }
+
+            const trace = Object.assign({}, figure.data[0], {locations: locations, customdata: customdata, z: z});
+            const coloraxis = Object.assign({}, figure.layout.coloraxis, {colorscale: cube.colorscale});
+            const layout = Object.assign({}, figure.layout, {coloraxis: coloraxis});
+            return Object.assign({}, figure, {data: [trace, ...figure.data.slice(1)], layout: layout});
+        },
+        update_disorder_tooltip: function(hover_data, tooltip_data) {
+            const no_update = window.dash_clientside.no_update;
+            if(!hover_data) {
+                // The estimate of the last hovered disorder stays displayed
+                return [false, no_update, no_update, no_update, no_update, no_update];
+            }
+            const point = hover_data.points[0];
+            const label = point.label;
+            return [
+                true,
+                point.bbox,
+                tooltip_data.titles[label],
+                tooltip_data.sparklines[label],
+                tooltip_data.estimates[label],
+                tooltip_data.estimate_labels[label]
+            ];
         }
     }
 });
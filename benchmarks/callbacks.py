@@ -0,0 +1,352 @@
+import argparse
+import contextvars
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+from dash._callback_context import context_value
+from dash._utils import AttributeDict, to_json
+
+import app  # noqa: F401 (registers the pages and their callbacks)
+from pages import gdp, global_analysis, survey_analysis
+from utils.cache import all_caches
+from utils.process_data import all_disorders_dataframes
+
+# Calls the server-side callbacks of the pages directly (no browser, no HTTP) with realistic inputs: every disorder,
+# the full continent selection and the widest year ranges. Run it from the root of the repository:
+#   python -m benchmarks.callbacks [--iterations 10] [--cold] [-k sankey] [--compare benchmarks/baselines/<commit>.json]
+BASELINES_PATH = 'benchmarks/baselines'
+PERCENTILES = [50, 95, 99]
+
+# `calls` is a list of (args, prop_id of the triggering input or None)
+Scenario = namedtuple('Scenario', ['name', 'func', 'calls'])
+
+
+def call_callback(func, args, triggered=None):
+    """
+    Call a callback the way Dash does, in a context where ctx.triggered_id is set, and serialize its output to JSON
+    """
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{'prop_id': triggered, 'value': None}] if triggered else []))
+        return to_json(func(*args))
+
+    return contextvars.copy_context().run(run)
+
+
+def get_year_range(disorder_name):
+    years = all_disorders_dataframes[disorder_name].prevalence_by_country['Year']
+    return [int(years.min()), int(years.max())]
+
+
+def apply_list_patch(data, patch):
+    """
+    Apply the operations of a serialized dash.Patch of a list (as the browser would)
+    """
+    data = list(data)
+    for operation in patch['operations']:
+        if operation['operation'] == 'Append':
+            data.append(operation['params']['value'])
+        elif operation['operation'] == 'Extend':
+            data.extend(operation['params']['value'])
+        elif operation['operation'] == 'Remove':
+            data.remove(operation['params']['value'])
+        elif operation['operation'] == 'Delete':
+            del data[operation['location'][0]]
+        elif operation['operation'] == 'Clear':
+            data.clear()
+    return data
+
+
+def select_all_continents(disorder_name):
+    """
+    Selected country ids once every continent has been added with the Quick Add dropdown
+    """
+    args = (None, global_analysis.all_continents, None, None, [], disorder_name)
+    patch, _ = json.loads(call_callback(global_analysis.update_selected_entities, args, 'select-continent.value'))
+    return apply_list_patch([], patch)
+
+
+def get_global_analysis_scenarios():
+    disorders = list(all_disorders_dataframes)
+    year_ranges = {disorder_name: get_year_range(disorder_name) for disorder_name in disorders}
+    selected_ids = {disorder_name: select_all_continents(disorder_name) for disorder_name in disorders}
+
+    average_keys = [
+        global_analysis.update_data_on_year(year_ranges[disorder_name], {'disorder': disorder_name})
+        for disorder_name in disorders
+    ]
+    annual_keys = [
+        global_analysis.update_annual_prevalence_country(
+            selected_ids[disorder_name], {'disorder': disorder_name}, year_ranges[disorder_name]
+        )
+        for disorder_name in disorders
+    ]
+
+    sankey_inputs = []
+    for disorder_name in disorders:
+        for switcher in [False, True]:
+            entities = selected_ids[disorder_name]
+            sankey_data = global_analysis.update_sankey_data(
+                disorder_name, entities, year_ranges[disorder_name], switcher
+            )
+            if sankey_data:
+                sankey_inputs.append((disorder_name, switcher, entities, sankey_data))
+
+    choropleth_point = {'points': [{'customdata': ['France', 'Europe'], 'z': 5.84}]}
+
+    return [
+        Scenario('global_analysis.update_selected_disorder_data', global_analysis.update_selected_disorder_data, [
+            ((disorder_name,), None) for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_year_slider', global_analysis.update_year_slider, [
+            ((None, disorder_name), None) for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_choropleth_fig[create]', global_analysis.update_choropleth_fig, [
+            ((key, key['disorder'], None), None) for key in average_keys
+        ]),
+        Scenario('global_analysis.update_choropleth_fig[patch]', global_analysis.update_choropleth_fig, [
+            ((key, key['disorder'], {'data': [{}]}), None) for key in average_keys
+        ]),
+        Scenario('global_analysis.update_choropleth_cube[create]', global_analysis.update_choropleth_cube, [
+            (({'disorder': disorder_name}, None), None) for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_choropleth_cube[update]', global_analysis.update_choropleth_cube, [
+            (({'disorder': disorder_name}, {'data': [{}]}), None) for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_selected_entities[continents]', global_analysis.update_selected_entities, [
+            ((None, global_analysis.all_continents, None, None, [], disorder_name), 'select-continent.value')
+            for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_selected_entities[click]', global_analysis.update_selected_entities, [
+            ((choropleth_point, [], None, None, [], disorder_name), 'choropleth-fig.clickData')
+            for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_selected_entities[remove]', global_analysis.update_selected_entities, [
+            ((None, global_analysis.all_continents[1:], None, None, selected_ids[disorder_name], disorder_name),
+             'select-continent.value')
+            for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_country_title', global_analysis.update_country_title, [
+            ((selected_ids[disorder_name],), None) for disorder_name in disorders
+        ]),
+        Scenario('global_analysis.update_choropleth_tooltip', global_analysis.update_choropleth_tooltip, [
+            ((choropleth_point, disorder_name, year_ranges[disorder_name]), None) for disorder_name in disorders
+        ]),
+        Scenario(
+            'global_analysis.update_annual_prevalence_country', global_analysis.update_annual_prevalence_country, [
+                ((selected_ids[disorder_name], {'disorder': disorder_name}, year_ranges[disorder_name]), None)
+                for disorder_name in disorders
+            ]
+        ),
+        Scenario('global_analysis.update_heatmap_fig[country]', global_analysis.update_heatmap_fig, [
+            ((key, False), None) for key in annual_keys
+        ]),
+        Scenario('global_analysis.update_heatmap_fig[continent]', global_analysis.update_heatmap_fig, [
+            ((key, True), None) for key in annual_keys
+        ]),
+        Scenario('global_analysis.update_sankey_data', global_analysis.update_sankey_data, [
+            ((disorder_name, entities, year_ranges[disorder_name], switcher), None)
+            for disorder_name, switcher, entities, _ in sankey_inputs
+        ]),
+        Scenario('global_analysis.update_sankey_year_slider', global_analysis.update_sankey_year_slider, [
+            ((sankey_data,), None) for *_, sankey_data in sankey_inputs
+        ]),
+        *[
+            Scenario(f'global_analysis.update_sankey_fig[{country_filter}]', global_analysis.update_sankey_fig, [
+                ((sankey_data, country_filter, sankey_data['years'][1], disorder_name, switcher), None)
+                for disorder_name, switcher, _, sankey_data in sankey_inputs
+            ])
+            for country_filter in ['top-5', 'all']
+        ],
+    ]
+
+
+def get_gdp_scenarios():
+    disorders = [option['value'] for option in gdp.layout['gdp-select-disease'].data]
+    continents = {disorder_name: gdp.update_select_list_continent(disorder_name).value for disorder_name in disorders}
+
+    return [
+        Scenario('gdp.update_select_list_continent', gdp.update_select_list_continent, [
+            ((disorder_name,), None) for disorder_name in disorders
+        ]),
+        Scenario('gdp.update_bubble_fig[continents]', gdp.update_bubble_fig, [
+            ((disorder_name, False, continents[disorder_name]), None) for disorder_name in disorders
+        ]),
+        Scenario('gdp.update_bubble_fig[incomes]', gdp.update_bubble_fig, [
+            ((disorder_name, True, None), None) for disorder_name in disorders
+        ]),
+    ]
+
+
+def get_survey_analysis_scenarios():
+    combinations = [
+        (question, continent)
+        for question in survey_analysis.all_questions
+        for continent in survey_analysis.all_continents
+    ]
+
+    return [
+        Scenario('survey_analysis.update_survey_question', survey_analysis.update_survey_question, [
+            (combination, None) for combination in combinations
+        ]),
+    ]
+
+
+def get_scenarios():
+    return [
+        *get_global_analysis_scenarios(),
+        *get_gdp_scenarios(),
+        *get_survey_analysis_scenarios(),
+    ]
+
+
+def invalidate_caches():
+    for cache in all_caches.values():
+        cache.invalidate()
+
+
+def run_scenario(scenario, iterations, cold=False):
+    """
+    Latency of each call over `iterations` passes on the inputs of the scenario (after a warm-up pass), then the peak
+    memory allocated by a call, measured in a separate pass as tracemalloc slows the calls down.
+    """
+    for args, triggered in scenario.calls:
+        call_callback(scenario.func, args, triggered)
+
+    durations, response_sizes = [], []
+    for _ in range(iterations):
+        for args, triggered in scenario.calls:
+            if cold:
+                invalidate_caches()
+            start = time.perf_counter()
+            response = call_callback(scenario.func, args, triggered)
+            durations.append(time.perf_counter() - start)
+            response_sizes.append(len(response))
+
+    peak_memory = 0
+    tracemalloc.start()
+    try:
+        for args, triggered in scenario.calls:
+            if cold:
+                invalidate_caches()
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            call_callback(scenario.func, args, triggered)
+            peak_memory = max(peak_memory, tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+
+    durations_ms = np.array(durations) * 1000
+    return {
+        'calls': len(scenario.calls),
+        'samples': len(durations),
+        **{f'p{p}_ms': round(float(np.percentile(durations_ms, p)), 3) for p in PERCENTILES},
+        'mean_ms': round(float(durations_ms.mean()), 3),
+        'max_ms': round(float(durations_ms.max()), 3),
+        'peak_memory_kib': round(peak_memory / 1024, 1),
+        'response_kib': round(float(np.mean(response_sizes)) / 1024, 1),
+    }
+
+
+def get_git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], text=True))
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return commit, dirty
+
+
+def print_results(results):
+    print(f'{"callback":<60}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"peak KiB":>12}{"resp KiB":>10}')
+    for name, result in results.items():
+        print(
+            f'{name:<60}{result["p50_ms"]:>10}{result["p95_ms"]:>10}{result["p99_ms"]:>10}'
+            f'{result["peak_memory_kib"]:>12}{result["response_kib"]:>10}'
+        )
+
+
+def compare_results(results, baseline, threshold):
+    """
+    Print the p50 and p95 ratios against a baseline, and return the names of the callbacks slower than the baseline
+    by more than `threshold` (e.g. 1.2 for 20%)
+    """
+    regressions = []
+    print(f'\nCompared to {baseline["commit"]} ({baseline["created"]}):')
+    print(f'{"callback":<60}{"p50 ms":>18}{"ratio":>8}{"p95 ms":>18}{"ratio":>8}')
+    for name, result in results.items():
+        if name not in baseline['results']:
+            print(f'{name:<60}{"(new)":>18}')
+            continue
+
+        previous = baseline['results'][name]
+        ratios = [result[f'p{p}_ms'] / max(previous[f'p{p}_ms'], 1e-3) for p in [50, 95]]
+        flag = ' <-- regression' if ratios[0] > threshold else ''
+        print(
+            f'{name:<60}{previous["p50_ms"]:>8} -> {result["p50_ms"]:<6}{ratios[0]:>8.2f}'
+            f'{previous["p95_ms"]:>8} -> {result["p95_ms"]:<6}{ratios[1]:>8.2f}{flag}'
+        )
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the Dash callbacks of every page')
+    parser.add_argument('--iterations', type=int, default=10, help='passes over the inputs of each callback')
+    parser.add_argument('-k', dest='keyword', help='only run the callbacks whose name contains this keyword')
+    parser.add_argument('--cold', action='store_true', help='empty the figure caches before each call')
+    parser.add_argument('--output', help=f'JSON baseline to write (default: {BASELINES_PATH}/<commit>.json)')
+    parser.add_argument('--no-output', action='store_true', help='do not write a baseline')
+    parser.add_argument('--compare', help='JSON baseline to compare the results with')
+    parser.add_argument('--threshold', type=float, default=1.2, help='p50 ratio over which a callback regressed')
+    args = parser.parse_args(argv)
+
+    scenarios = [
+        scenario for scenario in get_scenarios()
+        if not args.keyword or args.keyword in scenario.name
+    ]
+
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(scenario, args.iterations, cold=args.cold)
+        print(f'{scenario.name}: p50 {results[scenario.name]["p50_ms"]} ms', file=sys.stderr)
+
+    commit, dirty = get_git_commit()
+    report = {
+        'commit': f'{commit}-dirty' if dirty else commit,
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'iterations': args.iterations,
+        'cold': args.cold,
+        'results': results,
+    }
+
+    print_results(results)
+
+    if not args.no_output:
+        output = args.output or os.path.join(BASELINES_PATH, f'{report["commit"]}.json')
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'\nBaseline written to {output}')
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare_results(results, json.load(f), args.threshold)
+        if regressions:
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
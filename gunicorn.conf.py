@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+import time
+
+# Settings of gunicorn (read from the working directory by `gunicorn app:server`, see the Dockerfile).
+# The master makes sure the data snapshot is compiled before forking, and every worker memory-maps its numeric columns
+# (MH_DATA_MMAP): the data is held once in the OS cache whatever the number of workers, which can follow the number
+# of cores. Each setting can be overridden on the command line.
+# MH_DATA_MMAP is read once, when utils.data_snapshot is imported: it is set before the import.
+os.environ.setdefault('MH_DATA_MMAP', '1')
+
+from utils.data_snapshot import ensure_snapshot  # noqa: E402
+
+bind = f":{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+# Disabled, to let Cloud Run handle instance scaling
+timeout = 0
+
+# The app is imported, and its data and figure caches warmed up, once in the master (MH_PRELOAD=0 to import it in each
+# worker instead). Workers are forked with everything in memory. Building the cached figures takes ~10s with Plotly
+# Express and less than a second with MH_FAST_FIGURES=1: MH_WARM_FIGURES=0 only loads the data.
+preload_app = os.environ.get('MH_PRELOAD', '1') == '1'
+warm_figures = os.environ.get('MH_WARM_FIGURES', '1') == '1'
+
+# Compiled when the configuration is loaded: with preload_app, the app (and its data) is imported before any hook runs
+ensure_snapshot()
+
+
+def on_starting(server):
+    if not server.cfg.preload_app:
+        return
+
+    from app import warm_up
+
+    start = time.perf_counter()
+    warm_up(figures=warm_figures)
+    server.log.info('App warmed up in %.1fs', time.perf_counter() - start)
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        from app import reset_after_fork
+        reset_after_fork()
@@ -6,12 +6,14 @@ from dash import html, dcc, Input, Output, State, callback, ClientsideFunction,
 from dash_iconify import DashIconify
 
 from utils.ga_utils import create_country_title, update_no_data
+from utils.cache import FigureCache
 from utils.process_data import all_disorders_dataframes
 from utils.utils_config import FIG_CONFIG_WITH_DOWNLOAD, add_loading_overlay, HIDE, STORAGE_SESSION
 from utils.gdp_bubble import create_bubble
 from utils.gdp_utils import income_levels
 
 all_cols = all_disorders_dataframes['Anxiety'].prevalence_and_gdp.columns
+bubble_figures_cache = FigureCache('bubble_figures', maxsize=32)
 # pd.set_option('display.max_columns', None)
 
 dash.register_page(
@@ -183,15 +185,12 @@ def update_select_list_continent(disorder_name):
     )
 
 
-@callback(
-    Output('bubble-container', 'children'),
-    Input('gdp-select-disease', 'value'),
-    Input('switch-continent-incomes', 'checked'),
-    Input('gdp-select-continent', 'value'),
-    prevent_initial_call=True
-)
-def update_bubble_fig(disorder_name: str, switcher: bool, selected_continents: list):
-    df = all_disorders_dataframes[disorder_name].prevalence_and_gdp.sort_values(by='Year')
+def build_bubble_fig(disorder_name: str, switcher: bool, selected_continents: list):
+    # Sorted as int64 years: the default sort is not stable and its order of equal years, which sets the order (and
+    # colors) of the traces, depends on the dtype
+    df = all_disorders_dataframes[disorder_name].prevalence_and_gdp.sort_values(
+        by='Year', key=lambda years: years.astype('int64')
+    )
 
     # Filter on income levels or continents
     if switcher:
@@ -199,18 +198,48 @@ def update_bubble_fig(disorder_name: str, switcher: bool, selected_continents: l
     else:
         df = df.query("Continent != 'Unknown' and Continent in @selected_continents")
 
-    is_df_empty = df.empty
-    if is_df_empty:
-        return update_no_data(text='Please select continents from the dropdown list to display data.')
+    if df.empty:
+        return None
 
-    fig = create_bubble(
+    return create_bubble(
         df=df,
         switcher=switcher
     )
 
+
+@callback(
+    Output('bubble-container', 'children'),
+    Input('gdp-select-disease', 'value'),
+    Input('switch-continent-incomes', 'checked'),
+    Input('gdp-select-continent', 'value'),
+    prevent_initial_call=True
+)
+def update_bubble_fig(disorder_name: str, switcher: bool, selected_continents: list):
+    # Selected continents are ignored when filtering on income levels
+    continents_key = () if switcher else tuple(sorted(selected_continents or []))
+
+    fig = bubble_figures_cache.get_or_create(
+        (disorder_name, bool(switcher), continents_key),
+        lambda: build_bubble_fig(disorder_name, switcher, list(continents_key))
+    )
+
+    if fig is None:
+        return update_no_data(text='Please select continents from the dropdown list to display data.')
+
     return dcc.Graph(id="bubble-fig", config=FIG_CONFIG_WITH_DOWNLOAD, figure=fig)
 
 
+def warm_up():
+    """
+    Cache the bubble figures of the default selections of every disorder: all continents, and income levels
+    """
+    for disorder_name, disorder_df in all_disorders_dataframes.items():
+        if disorder_df.prevalence_and_gdp is None:
+            continue
+        update_bubble_fig(disorder_name, False, update_select_list_continent(disorder_name).value)
+        update_bubble_fig(disorder_name, True, None)
+
+
 clientside_callback(
     ClientsideFunction(namespace='clientside', function_name='update_disabled_state_select_continent'),
     Output('gdp-select-continent', 'disabled'),
@@ -7,10 +7,15 @@ from dash import html, dcc, callback, Input, Output, State, clientside_callback,
 from dash.exceptions import PreventUpdate
 from dash_iconify import DashIconify
 
-from utils.process_data import all_disorders_dataframes, country_code_to_continent_name, get_population_data
-from utils.ga_utils import calculate_slope, make_edit_icon, get_last_added_entity, update_last_entity, filter_dataframe, \
-    get_country_continent_name, create_country_title, update_no_data, clean_duplicated_columns
+from utils.process_data import all_disorders_dataframes, get_data_version
+from utils.ga_utils import make_edit_icon, get_country_continent_name, create_country_title, update_no_data, \
+    get_average_prevalence, get_heatmap_pivots
+from utils.cache import LRUCache
 from utils.ga_choropleth import create_choropleth_fig
+from utils.ga_prevalence_cube import get_prevalence_cube, CLIENTSIDE_CHOROPLETH
+from utils.ga_country_index import get_country_index, get_continent_country_ids
+from utils.ga_sankey_table import get_sankey_table
+from utils.figure_builder import continuous_colorscale
 from utils.ga_heatmap import create_heatmap
 from utils.ga_sankey import create_sankey
 from utils.ga_tabs import tabs_heatmap, tabs_sankey
@@ -25,10 +30,17 @@ all_continents = [
     if continent != 'Unknown'
 ]
 
-CHOROPLETH_INTERVAL = 50
 SLIDER_YEAR_INCREMENT = 10
 is_first_session = True
 
+# Session store of the ids of the selected countries (see CountryIndex), under a key which changes with the data: the
+# selection of a session is dropped when its ids may point to other countries
+SELECTED_ENTITIES_ID = f'selected-country-ids-{get_data_version()}'
+
+# Country and continent pivots of the heatmap by (disorder, year range, selected countries): flipping the
+# country/continent switch only re-renders the figure
+heatmap_pivots_cache = LRUCache('heatmap_pivots', maxsize=32)
+
 pd.set_option('display.max_rows', None)
 pd.set_option('display.max_columns', None)
 
@@ -222,10 +234,10 @@ layout = html.Div(
         dcc.Store(id='disorder-data'),
         dcc.Store(id='average-prevalence-per-country'),
         dcc.Store(id='annual-prevalence-per-country'),
-        dcc.Store(id='selected-entities', data={}, storage_type=STORAGE_SESSION),
-        dcc.Store(id='last-entity-add', data=[], storage_type=STORAGE_SESSION),
-        dcc.Store(id='cache-selected-continent', data=[], storage_type=STORAGE_SESSION),
-        dcc.Store(id='sankey-data', data=[])
+        dcc.Store(id=SELECTED_ENTITIES_ID, data=[], storage_type=STORAGE_SESSION),
+        dcc.Store(id='sankey-data', data=[]),
+        dcc.Store(id='choropleth-cube'),
+        dcc.Store(id='globe-rotation')
     ],
     id='global-analysis-container',
     className='animate__animated animate__fadeIn animate__slow'
@@ -238,9 +250,10 @@ layout = html.Div(
 )
 def update_selected_disorder_data(disorder_name):
     """
-    Update data related to the disorder selected (anxiety, bipolar, ..)
+    Update the key of the disorder selected (anxiety, bipolar, ..). Callbacks resolve it against the frames loaded in
+    process_data rather than shipping the records to the browser.
     """
-    return all_disorders_dataframes[disorder_name].prevalence_by_country.to_dict('records')
+    return {'disorder': disorder_name}
 
 
 @callback(
@@ -280,78 +293,112 @@ def update_year_slider(_, disorder_name):
     )
 
 
-@callback(
-    Output('average-prevalence-per-country', 'data'),
-    Input('year-slider', 'value'),
-    State('disorder-data', 'data'),
-    prevent_initial_call=True
-)
-def update_data_on_year(year_range, data):
+def create_choropleth_graph(data_to_df, disorder_name):
+    return [
+        dcc.Graph(
+            figure=create_choropleth_fig(
+                data_to_df,
+                color_scale=all_disorders_dataframes[disorder_name].color_scale
+            ),
+            config=FIG_CONFIG_WITHOUT_DOWNLOAD,
+            id='choropleth-fig',
+            className='graph-container',
+            # clear_on_unhover=True,
+            responsive=True
+        )
+    ]
+
+
+def update_data_on_year(year_range, disorder_key):
     """
-    Create a new subset from the main disorder data which is filtered on a specific year range
+    Update the key of the disorder data averaged on a specific year range
     """
-    df = pd.DataFrame(data)
-    filtered_on_year = df.query("@year_range[0] <= Year <= @year_range[1]")
-    filtered_on_year_grouped = filtered_on_year.groupby(['Entity', 'Code'])['Value'].mean().reset_index()
-    return filtered_on_year_grouped.to_dict('records')
+    return {**disorder_key, 'year_range': year_range}
 
 
-@callback(
-    Output('choropleth-container', 'children'),
-    Output('choropleth-fig', 'figure', allow_duplicate=True),
-    Input('average-prevalence-per-country', 'data'),
-    State('select-disorder', 'value'),
-    State('choropleth-fig', 'figure'),
-    prevent_initial_call=True
-)
-def update_choropleth_fig(data, disorder_name, figure):
+def update_choropleth_fig(dataset_key, disorder_name, figure):
     """
     Update the choropleth figure with disorder data filtered on a specif year range
     """
-    data_to_df = pd.DataFrame(data)
-    data_to_df['Continent'] = data_to_df['Code'].apply(country_code_to_continent_name)
+    data_to_df = get_average_prevalence(dataset_key)
 
     if figure:
-        color_scale_seq = all_disorders_dataframes[disorder_name].color_scale
-
         patched_choropleth = Patch()
         patched_choropleth['data'][0]['customdata'] = list(zip(data_to_df['Entity'], data_to_df['Continent']))
-        patched_choropleth['data'][0]['locations'] = data_to_df['Code']
-        patched_choropleth['data'][0]['z'] = data_to_df['Value']
-        patched_choropleth['layout']['coloraxis']['colorscale'] = [
-            [i / (len(color_scale_seq) - 1), color] for i, color in enumerate(color_scale_seq)
-        ]
+        patched_choropleth['data'][0]['locations'] = data_to_df['Code'].tolist()
+        patched_choropleth['data'][0]['z'] = data_to_df['Value'].tolist()
+        patched_choropleth['layout']['coloraxis']['colorscale'] = continuous_colorscale(
+            all_disorders_dataframes[disorder_name].color_scale
+        )
 
         return no_update, patched_choropleth
 
-    return [
-        dcc.Graph(
-            figure=create_choropleth_fig(
-                data_to_df,
-                color_scale=all_disorders_dataframes[disorder_name].color_scale
-            ),
-            config=FIG_CONFIG_WITHOUT_DOWNLOAD,
-            id='choropleth-fig',
-            className='graph-container',
-            # clear_on_unhover=True,
-            responsive=True
-        ),
-        dcc.Interval(id='choropleth-interval', interval=CHOROPLETH_INTERVAL),
-    ], no_update
+    return create_choropleth_graph(data_to_df, disorder_name), no_update
+
+
+def update_choropleth_cube(disorder_key, figure):
+    """
+    Send the prevalence cube of the selected disorder to the browser, which averages it over the year range and updates
+    the choropleth (update_choropleth_year_range in clientside.js). The figure is only created by the server once.
+    """
+    disorder_name = disorder_key['disorder']
+    cube = get_prevalence_cube(disorder_name)
+    cube_data = {
+        **cube.to_clientside(),
+        'colorscale': continuous_colorscale(all_disorders_dataframes[disorder_name].color_scale)
+    }
+
+    if figure:
+        return cube_data, no_update
+
+    return cube_data, create_choropleth_graph(cube.get_average(cube.years[0], cube.years[-1]), disorder_name)
+
+
+# The choropleth is averaged over the year range either by the server, on each move of the year slider, or in the
+# browser from the cube of the disorder (MH_CLIENTSIDE_CHOROPLETH=1), which is only sent when the disorder changes
+if CLIENTSIDE_CHOROPLETH:
+    callback(
+        Output('choropleth-cube', 'data'),
+        Output('choropleth-container', 'children'),
+        Input('disorder-data', 'data'),
+        State('choropleth-fig', 'figure')
+    )(update_choropleth_cube)
+
+    clientside_callback(
+        ClientsideFunction(namespace='clientside', function_name='update_choropleth_year_range'),
+        Output('choropleth-fig', 'figure', allow_duplicate=True),
+        Input('year-slider', 'value'),
+        Input('choropleth-cube', 'data'),
+        Input('choropleth-container', 'children'),
+        State('choropleth-fig', 'figure'),
+        prevent_initial_call=True
+    )
+else:
+    callback(
+        Output('average-prevalence-per-country', 'data'),
+        Input('year-slider', 'value'),
+        State('disorder-data', 'data'),
+        prevent_initial_call=True
+    )(update_data_on_year)
+
+    callback(
+        Output('choropleth-container', 'children'),
+        Output('choropleth-fig', 'figure', allow_duplicate=True),
+        Input('average-prevalence-per-country', 'data'),
+        State('select-disorder', 'value'),
+        State('choropleth-fig', 'figure'),
+        prevent_initial_call=True
+    )(update_choropleth_fig)
 
 
 @callback(
-    Output('selected-entities', 'data'),
-    Output('last-entity-add', 'data'),
-    Output('cache-selected-continent', 'data'),
+    Output(SELECTED_ENTITIES_ID, 'data'),
     Output('select-continent', 'value'),
     Input('choropleth-fig', 'clickData'),
     Input('select-continent', 'value'),
     Input('del-last-selected-country', 'n_clicks'),
     Input('del-all-selected-country', 'n_clicks'),
-    State('selected-entities', 'data'),
-    State('last-entity-add', 'data'),
-    State('cache-selected-continent', 'data'),
+    State(SELECTED_ENTITIES_ID, 'data'),
     State('select-disorder', 'value'),
     prevent_initial_call=True
 )
@@ -359,103 +406,89 @@ def update_selected_entities(
         choropleth_data,
         selected_continent,
         _1, _2,
-        current_entities: dict,
-        last_entity: list,
-        cache_continent: list,
+        stored_ids,
         disorder_name: str
 ):
     """
-    Update the dcc.Store which contains the list of all selected entities
+    Update the dcc.Store of the selected countries: their ids (see CountryIndex) in the order they were added, the
+    last one being the last added. Only the change is sent back, as a Patch of the list, unless the stored value is
+    not a valid list of ids: it is then replaced as a whole.
     """
     input_id = ctx.triggered_id
+    country_index = get_country_index()
+    selected_ids = country_index.get_valid_ids(stored_ids)
+    patched_ids = Patch() if selected_ids == stored_ids else []
 
     # Get country on choropleth click
     if choropleth_data and input_id == 'choropleth-fig':
-        new_country, new_continent = get_country_continent_name(choropleth_data)
+        new_country, _ = get_country_continent_name(choropleth_data)
+        new_id = country_index.get_id(new_country)
 
-        if new_continent not in {continent for continent in current_entities}:
-            current_entities.update({new_continent: [new_country]})
-            update_last_entity(last_entity, new_continent, new_country)
-            cache_continent.append(new_continent)
-        elif new_country not in current_entities[new_continent]:
-            current_entities[new_continent].append(new_country)
-            update_last_entity(last_entity, new_continent, new_country)
+        if new_id in selected_ids:
+            raise PreventUpdate
 
-    elif input_id == 'select-continent':
-        difference_cache_and_selected = len(cache_continent) - len(selected_continent)
-
-        # Case where a continent have been deleted by user
-        if difference_cache_and_selected > 0 and current_entities:
-            continent_to_remove = [continent for continent in cache_continent if continent not in selected_continent]
+        patched_ids.append(new_id)
+        selected_ids = selected_ids + [new_id]
 
-            # Delete continent from current_entities, last_entity and cache_continent:
-            del current_entities[continent_to_remove[0]]
-            last_entity = [
-                [continent, country] for continent, country in last_entity if continent != continent_to_remove[0]
+    elif input_id == 'select-continent':
+        continents_to_remove = set(country_index.get_continents(selected_ids)) - set(selected_continent)
+
+        # Case where a continent have been deleted by user: delete all its countries (the remaining ids are sent
+        # rather than one removal per country)
+        if continents_to_remove:
+            selected_ids = [
+                country_id for country_id, continent in zip(selected_ids, country_index.get_continents(selected_ids))
+                if continent not in continents_to_remove
             ]
-            cache_continent.remove(continent_to_remove[0])
+            patched_ids = selected_ids
 
         else:
-            # Add new continent with associated countries
-            disorder_df = all_disorders_dataframes[disorder_name].prevalence_by_country
-
-            for continent in selected_continent:
-                disorder_df_filtered = disorder_df.query('Continent in @continent')[
-                    ['Entity', 'Continent']].drop_duplicates()
-
-                for i, row in enumerate(disorder_df_filtered.iterrows()):
-                    continent, country = row[1]['Continent'], row[1]['Entity']
-
-                    if continent not in current_entities:
-                        current_entities.update({continent: [country]})
-                    else:
-                        if country not in current_entities[continent]:
-                            current_entities[continent].append(country)
-
-                    update_last_entity(last_entity, continent, country)
+            # Add the countries of the selected continents which are not selected yet
+            ids_to_add = [
+                country_id
+                for continent in selected_continent
+                for country_id in get_continent_country_ids(disorder_name, continent)
+                if country_id not in selected_ids
+            ]
+            if not ids_to_add:
+                raise PreventUpdate
 
-                # Update cache with new continent:
-                _, last_continent, = get_last_added_entity(last_entity)
-                if last_continent not in cache_continent:
-                    cache_continent.append(last_continent)
+            patched_ids.extend(ids_to_add)
+            selected_ids = selected_ids + ids_to_add
 
     # Delete the last country selected or clear all the countries
-    elif all((input_id.startswith('del'), current_entities, last_entity)):
+    elif input_id.startswith('del') and selected_ids:
 
         if 'last' in input_id:
-            country_to_del, continent_targ = get_last_added_entity(last_entity)
-
-            # Remove last country added:
-            current_entities[continent_targ].remove(country_to_del)
-
-            # Check if the continent key has remaining countries, else delete it:
-            if not current_entities[continent_targ]:
-                del current_entities[continent_targ]
-                cache_continent.remove(continent_targ)
-
-            # Remove the deleted entity (the last element) from last_entity:
-            last_entity.pop()
-
+            del patched_ids[len(selected_ids) - 1]
+            selected_ids = selected_ids[:-1]
         else:
-            current_entities, last_entity, cache_continent = dict(), list(), list()
+            patched_ids.clear()
+            selected_ids = []
 
-    selected_continent = cache_continent
+    else:
+        raise PreventUpdate
+
+    # Continents with at least one selected country, in the order they were added
+    selected_continent = list(dict.fromkeys(country_index.get_continents(selected_ids)))
 
-    return current_entities, last_entity, cache_continent, selected_continent
+    return patched_ids, selected_continent
 
 
 @callback(
     Output('country-title-container', 'children'),
     Output('base-title', 'children'),
-    Input('last-entity-add', 'data'),
+    Input(SELECTED_ENTITIES_ID, 'data'),
     prevent_initial_call=True
 )
-def update_country_title(last_entity: list):
+def update_country_title(stored_ids):
     """
     Update the main title based on the last selected country from the user
     """
-    if last_entity:
-        last_country, *_ = get_last_added_entity(last_entity)
+    country_index = get_country_index()
+    selected_ids = country_index.get_valid_ids(stored_ids)
+    if selected_ids:
+        last_country, = country_index.get_names(selected_ids[-1:])
 
         return create_country_title(
             last_country,
@@ -503,25 +536,22 @@ def update_choropleth_tooltip(data, disorder_name, year_range):
 
 @callback(
     Output('annual-prevalence-per-country', 'data'),
-    Input('selected-entities', 'data'),
+    Input(SELECTED_ENTITIES_ID, 'data'),
     Input('disorder-data', 'data'),
     Input('year-slider', 'value'),
     prevent_initial_call=True
 )
-def update_annual_prevalence_country(selected_entities, disorder_data, year_range):
+def update_annual_prevalence_country(stored_ids, disorder_key, year_range):
     """
     Update the annual prevalence country data.
     This callback is triggered when users click on countries (choropleth-map), edit the year interval (year-slider),
     edit the disorder data (disorder-data).
-    This will return a filtered dataset which contains all the countries selected and will be used in another callback
-    to build the charts (heatmap, sankey).
+    This will return the key of a filtered dataset which contains all the countries selected and will be used in
+    another callback to build the charts (heatmap, sankey).
     """
-
-    if all((selected_entities, disorder_data, year_range)):
-        df = pd.DataFrame(disorder_data)
-        countries = [country for sublist in selected_entities.values() for country in sublist]
-        filtered_df = filter_dataframe(df, countries, year_range, 'Entity')
-        return filtered_df.to_dict('records')
+    selected_ids = get_country_index().get_valid_ids(stored_ids)
+    if all((selected_ids, disorder_key, year_range)):
+        return {**disorder_key, 'year_range': year_range, 'entities': sorted(selected_ids)}
 
     return None
 
@@ -532,27 +562,22 @@ def update_annual_prevalence_country(selected_entities, disorder_data, year_rang
     Input('switch-country-continent', 'checked'),
     prevent_initial_call=True
 )
-def update_heatmap_fig(filtered_data, switch_filter):
-    if not filtered_data:
+def update_heatmap_fig(dataset_key, switch_filter):
+    if not dataset_key:
         return update_no_data(
             text='Please choose countries by clicking on the globe, or add them quickly by selecting a continent from '
                  'the dropdown list'
         )
 
-    filtered_df = pd.DataFrame(filtered_data)
-    disorder_name = filtered_df.iloc[0]['Disorder']
-    grouping_field = (switch_filter and 'Continent') or 'Entity'  # Column to use when grouping filtered_df
+    disorder_name = dataset_key['disorder']
+    grouping_field = (switch_filter and 'Continent') or 'Entity'  # Rows of the heatmap
 
-    # Grouping by Continent and Year to compute the Mean per Continent before computing the slope
-    if switch_filter:
-        filtered_df = filtered_df.groupby(['Continent', 'Year'])['Value'].mean().reset_index()
-
-    slope_by_entity = filtered_df.groupby(grouping_field)['Value'].apply(calculate_slope)
-    sorted_entities = slope_by_entity.sort_values(ascending=False).index
-
-    # Data management for plotting heatmap
-    df_pivot = filtered_df.pivot(index=grouping_field, columns='Year', values='Value')
-    df_normalized = df_pivot.apply(lambda x: (x - x.min()) / (x.max() - x.min()), axis=1).reindex(sorted_entities)
+    pivots = heatmap_pivots_cache.get_or_create(
+        (disorder_name, tuple(dataset_key['year_range']), tuple(dataset_key['entities'])),
+        lambda: get_heatmap_pivots(dataset_key)
+    )
+    df_normalized = pivots[grouping_field]
+    sorted_entities = df_normalized.index
 
     heatmap_graph_object = add_loading_overlay(
         elements=dcc.Graph(
@@ -573,30 +598,27 @@ def update_heatmap_fig(filtered_data, switch_filter):
 @callback(
     Output('sankey-data', 'data'),
     Input('select-disorder', 'value'),
-    Input('selected-entities', 'data'),
+    Input(SELECTED_ENTITIES_ID, 'data'),
     Input('year-slider', 'value'),
     Input('switch-age-sex', 'checked'),
     prevent_initial_call=True
 )
-def update_sankey_data(disorder_name, entities, year_range, switcher):
-    all_countries = [country for sublist in entities.values() for country in sublist]
-
-    if not all_countries or (not switcher and disorder_name == 'Eating'):
+def update_sankey_data(disorder_name, stored_ids, year_range, switcher):
+    """
+    Update the key of the sankey data: the SankeyTable of the disorder (by sex or by age), the selected countries and
+    the years for which they have data within the year range. None when there is no data.
+    """
+    selected_ids = get_country_index().get_valid_ids(stored_ids)
+    if not selected_ids or (not switcher and disorder_name == 'Eating'):
         return None
 
-    if switcher:
-        df_to_use = all_disorders_dataframes[disorder_name].prevalence_by_sex
-    else:
-        df_to_use = all_disorders_dataframes[disorder_name].prevalence_by_age
-
-    filtered_df = filter_dataframe(
-        df=df_to_use,
-        entities=all_countries,
-        column_to_filter='Entity',
-        year_range=year_range
+    years = get_sankey_table(disorder_name, switcher).get_year_range(
+        get_country_index().get_names(selected_ids), year_range
     )
+    if years is None:
+        return None
 
-    return filtered_df.to_dict('records')
+    return {'disorder': disorder_name, 'by_sex': switcher, 'entities': sorted(selected_ids), 'years': years}
 
 
 @callback(
@@ -606,46 +628,26 @@ def update_sankey_data(disorder_name, entities, year_range, switcher):
     Input('sankey-year-slider', 'value'),
     State('select-disorder', 'value'),
     State('switch-age-sex', 'checked'),
-    State('selected-entities', 'data'),
     prevent_initial_call=True
 )
-def update_sankey_fig(sankey_data, country_filter_selection, sankey_year, disorder_name, switcher, entities):
-    if not sankey_data and not switcher and disorder_name == 'Eating':
+def update_sankey_fig(sankey_key, country_filter_selection, sankey_year, disorder_name, switcher):
+    if not sankey_key and not switcher and disorder_name == 'Eating':
         return update_no_data(
             text='Unfortunately, there is no available age category data for eating disorders at this time'
         )
-    if not sankey_data:
+    if not sankey_key:
         return update_no_data(
             text='Please choose countries by clicking on the globe, or add them quickly by selecting a continent from '
                  'the dropdown list'
         )
 
-    # Initialize data for Sankey
-    filtered_df = pd.DataFrame(sankey_data)
-    filtered_df_on_year = filtered_df.query('Year == @sankey_year')
-    filtered_categories = [category for category in filtered_df_on_year.columns[3:-1]]
-
-    # Add column with estimated population for each country
-    all_countries = [country for item in entities.values() for country in item]
-    population_per_country_df = get_population_data(entities=all_countries, year=sankey_year)
-    filtered_df_on_year_with_pop = filtered_df_on_year.merge(population_per_country_df, on='Entity', how='inner')
-    filtered_df_on_year_with_pop = filtered_df_on_year_with_pop[
-        [col for col in filtered_df_on_year_with_pop.columns if not col.endswith('_y')]
-    ]
-    filtered_df_on_year_with_pop.columns = [col.replace('_x', '') for col in filtered_df_on_year_with_pop.columns]
-
-    # Add column with prevalence global per country
-    prevalence_global_country = all_disorders_dataframes[disorder_name].prevalence_by_country
-    prevalence_global_country = filter_dataframe(
-        df=prevalence_global_country,
-        entities=all_countries,
-        column_to_filter='Entity',
-        year_range=sankey_year
+    # Rows of the selected year, already joined with the population and the global prevalence of each country
+    disorder_name, switcher = sankey_key['disorder'], sankey_key['by_sex']
+    sankey_table = get_sankey_table(disorder_name, switcher)
+    filtered_df_on_year_with_pop = sankey_table.get_year(
+        get_country_index().get_names(sankey_key['entities']), sankey_year
     )
-    filtered_df_on_year_with_pop = filtered_df_on_year_with_pop.merge(
-        prevalence_global_country, on='Entity', how='inner')
-    filtered_df_on_year_with_pop = clean_duplicated_columns(filtered_df_on_year_with_pop)
-    filtered_df_on_year_with_pop = filtered_df_on_year_with_pop.rename(columns={'Value': 'GlobalPrevalence'})
+    filtered_categories = sankey_table.categories
 
     if switcher:
         title = f'Global Mapping of {disorder_name} Prevalence by Gender: From Continent to Country'
@@ -672,10 +674,9 @@ def update_sankey_fig(sankey_data, country_filter_selection, sankey_year, disord
     Input('sankey-data', 'data'),
     prevent_initial_call=True
 )
-def update_sankey_year_slider(sankey_data):
-    if sankey_data:
-        df = pd.DataFrame(sankey_data)
-        min_year, max_year = df['Year'].min(), df['Year'].max()
+def update_sankey_year_slider(sankey_key):
+    if sankey_key:
+        min_year, max_year = sankey_key['years']
         thresholds_steps = [(10, 1), (15, 2), (30, 5)]
         range_year = max_year - min_year
         step = next(step for threshold, step in thresholds_steps if range_year <= threshold)
@@ -693,15 +694,29 @@ def update_sankey_year_slider(sankey_data):
 @callback(
     Output('switch-country-continent', 'disabled'),
     Output('switch-age-sex', 'disabled'),
-    Input('selected-entities', 'data'),
+    Input(SELECTED_ENTITIES_ID, 'data'),
     prevent_initial_call=True
 )
-def update_state_switcher(data):
-    if not data:
+def update_state_switcher(stored_ids):
+    if not get_country_index().get_valid_ids(stored_ids):
         return True, True
     return False, False
 
 
+def warm_up():
+    """
+    Build the prevalence cube (choropleth averages) and the sankey tables of every disorder, and the ids of the
+    countries of each continent
+    """
+    for disorder_name, disorder_df in all_disorders_dataframes.items():
+        get_prevalence_cube(disorder_name)
+        get_sankey_table(disorder_name, by_sex=True)
+        if disorder_df.prevalence_by_age is not None:
+            get_sankey_table(disorder_name, by_sex=False)
+        for continent in all_continents:
+            get_continent_country_ids(disorder_name, continent)
+
+
 clientside_callback(
     ClientsideFunction(namespace='clientside', function_name='toggle_modal_heatmap'),
     Output('data-modal-heatmap', 'opened'),
@@ -716,45 +731,9 @@ clientside_callback(
     State('data-modal-sankey', 'opened')
 )
 
+# The globe is rotated by the browser at each animation frame (see globe_rotation in clientside.js)
 clientside_callback(
-    ClientsideFunction(namespace='clientside', function_name='stop_animate_choropleth'),
-    Output('choropleth-interval', 'max_intervals'),
+    ClientsideFunction(namespace='clientside', function_name='toggle_globe_rotation'),
+    Output('globe-rotation', 'data'),
     Input('stop-interval', 'n_clicks')
 )
-
-clientside_callback(
-    """
-    function(_, figure) {
-        let rotation_lon = figure.layout.geo.projection.rotation.lon;
-        let rotation_lat = figure.layout.geo.projection.rotation.lat;
-
-        if (rotation_lon <= -180) {
-            rotation_lon = 180;
-        }
-
-        if (rotation_lon >= 180) {
-            rotation_lon = -180;
-        }
-
-        if (rotation_lat >= 90) {
-            rotation_lat = 90;
-        } else if (rotation_lat <= -90) {
-            rotation_lat = -90;
-        }
-
-        if (Math.abs(0 - rotation_lat) < 0.01) {
-            rotation_lat = 0;
-        }
-
-        const updatedFigure = Object.assign({}, figure);
-        updatedFigure.layout.geo.projection.rotation.lon = rotation_lon + 0.5;
-        updatedFigure.layout.geo.projection.rotation.lat = rotation_lat;
-
-        return updatedFigure;
-    }
-    """,
-    Output('choropleth-fig', 'figure'),
-    Input('choropleth-interval', 'n_intervals'),
-    State('choropleth-fig', 'figure'),
-    prevent_initial_call=True
-)
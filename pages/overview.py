@@ -1,11 +1,11 @@
 import dash
-from dash import html, dcc, callback, Input, Output, State, ctx, no_update, clientside_callback, ClientsideFunction
+from dash import dcc, callback, Input, Output, State, ctx, clientside_callback, ClientsideFunction
 from dash_iconify import DashIconify
 from dash.exceptions import PreventUpdate
 import dash_mantine_components as dmc
 import dash_extensions as de
 
-from utils.overview_figures import disorder_bar_fig, graph_functions, prevalence_by_disorder
+from utils.overview_figures import disorder_bar_fig, sparkline_figures, estimated_people_affected
 from utils.overview_accordion import disorders_accordion
 from utils.utils_config import FIG_CONFIG_WITHOUT_DOWNLOAD, FIG_CONFIG_WITH_DOWNLOAD, BG_TRANSPARENT, MAIN_TITLE_COLOR, \
     add_loading_overlay
@@ -24,16 +24,21 @@ dash.register_page(
 )
 
 
+def estimate_label(disorder_name):
+    return f'Estimated affected people by {disorder_name} disorder in millions'
+
+
 def estimate_case(estimate, disorder_name):
     return [
         dmc.Tooltip(
-            label=f'Estimated affected people by {disorder_name} disorder in millions',
+            label=estimate_label(disorder_name),
+            id='estimate-tooltip',
             children=[
                 dmc.Group(
                     [
                         DashIconify(icon='fluent:people-team-16-regular', height=35,
                                     color=MAIN_TITLE_COLOR),
-                        dmc.Title(f'{estimate}M', order=2, color=MAIN_TITLE_COLOR)
+                        dmc.Title(f'{estimate}M', order=2, color=MAIN_TITLE_COLOR, id='estimate-value')
                     ],
                     position='center',
                     mb='lg',
@@ -46,6 +51,15 @@ def estimate_case(estimate, disorder_name):
     ]
 
 
+# Everything the hover tooltip shows, sent once with the layout: hovering the bars is handled by the browser only
+overview_tooltip_data = {
+    'sparklines': sparkline_figures,
+    'titles': {disorder_name: f'{disorder_name} Disorder Prevalence (%)' for disorder_name in sparkline_figures},
+    'estimates': {disorder_name: f'{estimate}M' for disorder_name, estimate in estimated_people_affected.items()},
+    'estimate_labels': {disorder_name: estimate_label(disorder_name) for disorder_name in estimated_people_affected}
+}
+
+
 layout = dmc.NotificationsProvider(
     [
         dmc.Grid(
@@ -85,10 +99,31 @@ layout = dmc.NotificationsProvider(
                     [
                         dmc.Stack(
                             [
-                                dmc.Container(id='estimate-container', px=0, children=[html.Div(id='group-estimate')]),
+                                dmc.Container(
+                                    id='estimate-container',
+                                    px=0,
+                                    children=estimate_case(estimated_people_affected['Anxiety'], 'Anxiety')
+                                ),
                                 dcc.Graph(figure=disorder_bar_fig, config=FIG_CONFIG_WITH_DOWNLOAD,
                                           id='disorder-fig', clear_on_unhover=True),
                                 dcc.Tooltip(
+                                    dmc.Container(
+                                        [
+                                            dmc.Text(
+                                                id='tooltip-disorder-title',
+                                                italic=True,
+                                                size='xs',
+                                                color='white',
+                                                mb=5
+                                            ),
+                                            dcc.Graph(
+                                                id='tooltip-disorder-sparkline',
+                                                figure=sparkline_figures['Anxiety'],
+                                                config=FIG_CONFIG_WITHOUT_DOWNLOAD
+                                            )
+                                        ],
+                                        px=0
+                                    ),
                                     id='tooltip-disorder-fig',
                                     direction='bottom',
                                     background_color='rgba(11, 6, 81, 0.8)',
@@ -111,48 +146,23 @@ layout = dmc.NotificationsProvider(
             id='overview-container',
             className='animate__animated animate__fadeIn animate__slow'
         ),
-        dmc.Container(id='notifications-container')
+        dmc.Container(id='notifications-container'),
+        dcc.Store(id='overview-tooltip-data', data=overview_tooltip_data)
     ]
 )
 
 
-@callback(
+clientside_callback(
+    ClientsideFunction(namespace='clientside', function_name='update_disorder_tooltip'),
     Output('tooltip-disorder-fig', 'show'),
     Output('tooltip-disorder-fig', 'bbox'),
-    Output('tooltip-disorder-fig', 'children'),
-    Output('estimate-container', 'children'),
+    Output('tooltip-disorder-title', 'children'),
+    Output('tooltip-disorder-sparkline', 'figure'),
+    Output('estimate-value', 'children'),
+    Output('estimate-tooltip', 'label'),
     Input('disorder-fig', 'hoverData'),
-    State('estimate-container', 'children')
+    State('overview-tooltip-data', 'data')
 )
-def update_disorder_tooltip(hover_data, current_estimated_container):
-
-    if hover_data:
-        bbox = hover_data['points'][0]["bbox"]
-        label = hover_data['points'][0]['label']
-
-        children = dmc.Container(
-            [
-                dmc.Text(f'{label} Disorder Prevalence (%)', italic=True, size='xs', color='white', mb=5),
-                dcc.Graph(figure=graph_functions[label](), config=FIG_CONFIG_WITHOUT_DOWNLOAD)
-            ],
-            px=0
-        )
-
-        disorder_estimated_case = estimate_case(
-            prevalence_by_disorder.query('Disorder == @label')['EstimatedPeopleAffected'].iloc[0], label
-        )
-
-        return True, bbox, children, disorder_estimated_case
-
-    if not current_estimated_container[0]['props']['children']:
-        disorder_estimated_case = estimate_case(
-            estimate=prevalence_by_disorder.query("Disorder == 'Anxiety'")['EstimatedPeopleAffected'].iloc[0],
-            disorder_name='Anxiety'
-        )
-    else:
-        disorder_estimated_case = current_estimated_container
-
-    return False, no_update, no_update, disorder_estimated_case
 
 
 @callback(
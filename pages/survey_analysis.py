@@ -4,16 +4,19 @@ from random import choice
 from dash import html, dcc, callback, Input, Output, State
 import dash_mantine_components as dmc
 
+from utils.cache import FigureCache
 from utils.ga_utils import create_country_title
 from utils.process_surveys_data import merged_survey_df
 from utils.sa_figures import create_bar_fig
-from utils.sa_utils import filter_on_continent, filter_on_entity
+from utils.sa_utils import build_survey_index
 from utils.utils_config import FIG_CONFIG_WITH_DOWNLOAD, add_loading_overlay, HIDE, STORAGE_SESSION
 from utils.gdp_utils import income_levels
 
 basic_cols = ['Entity', 'Code', 'Year', 'Continent']
 all_questions = [question for question in merged_survey_df.columns if question not in basic_cols]
 all_continents = [continent for continent in merged_survey_df['Continent'].unique() if continent != 'Unknown']
+survey_index = build_survey_index(merged_survey_df, all_questions, all_continents, income_levels)
+survey_figures_cache = FigureCache('survey_figures', maxsize=len(survey_index))
 
 dash.register_page(
     __name__,
@@ -154,15 +157,49 @@ layout = html.Div(
 )
 
 
+def build_survey_figures(question, continent):
+    survey_slice = survey_index[(question, continent)]
+
+    # Get all countries:
+    fig_country = create_bar_fig(
+        survey_slice.country_rates,
+        x='Entity',
+        y=question,
+        continent=continent,
+        y_ticksuffix='   ',
+        color_seq=px.colors.sequential.Agsunset_r
+    )
+
+    # Get value for incomes categories:
+    fig_income = create_bar_fig(
+        survey_slice.income_rates,
+        x='Entity',
+        y=question,
+        continent=continent,
+        width_traces=0.1,
+        side_yaxis='right',
+        y_tickprefix='   ',
+        autorange='reversed',
+        color_seq=px.colors.sequential.Teal
+    )
+
+    return {'country': fig_country, 'income': fig_income}
+
+
 @callback(
     Output('question-title', 'children'),
     Output('progress-container', 'children'),
+    Output('country-fig-container', 'children'),
+    Output('income-fig-container', 'children'),
     Input('sa-select-question', 'value'),
     Input('sa-select-continent', 'value'),
 )
-def update_question_title(question, continent):
-    survey_filtered = merged_survey_df[basic_cols + [question]]
-    survey_continent_rates = round(filter_on_entity(survey_filtered, continent)[question].iloc[0])
+def update_survey_question(question, continent):
+    """
+    Update the title, the continent rate and the country and income figures of the selected question and continent
+    in a single round-trip. Figures are cached by (question, continent).
+    """
+    survey_continent_rates = round(survey_index[(question, continent)].continent_rate)
 
     title = create_country_title(
         text=f'{question} in {continent}',
@@ -187,47 +224,26 @@ def update_question_title(question, continent):
         style={'width': '50%'}
     )
 
-    return title, progress_bar
-
-
-@callback(
-    Output('country-fig-container', 'children'),
-    Output('income-fig-container', 'children'),
-    Input('sa-select-question', 'value'),
-    Input('sa-select-continent', 'value'),
-)
-def update_country_fig(question, continent):
-    survey_filtered = merged_survey_df[basic_cols + [question]]
-
-    # Get all countries:
-    survey_filtered_country = filter_on_continent(survey_filtered, continent)
-    fig_country = create_bar_fig(
-        survey_filtered_country,
-        x='Entity',
-        y=question,
-        continent=continent,
-        y_ticksuffix='   ',
-        color_seq=px.colors.sequential.Agsunset_r
-    )
-
-    # Get value for incomes categories:
-    survey_filtered_income = filter_on_entity(survey_filtered, income_levels)
-    fig_income = create_bar_fig(
-        survey_filtered_income,
-        x='Entity',
-        y=question,
-        continent=continent,
-        width_traces=0.1,
-        side_yaxis='right',
-        y_tickprefix='   ',
-        autorange='reversed',
-        color_seq=px.colors.sequential.Teal
+    figures = survey_figures_cache.get_or_create(
+        (question, continent),
+        lambda: build_survey_figures(question, continent)
     )
 
     country_graph_object = add_loading_overlay(
-        dcc.Graph(figure=fig_country, config=FIG_CONFIG_WITH_DOWNLOAD, id='country-rate')
+        dcc.Graph(figure=figures['country'], config=FIG_CONFIG_WITH_DOWNLOAD, id='country-rate')
     )
 
-    income_graph_object = dcc.Graph(figure=fig_income, config=FIG_CONFIG_WITH_DOWNLOAD, id='income-rate')
+    income_graph_object = dcc.Graph(figure=figures['income'], config=FIG_CONFIG_WITH_DOWNLOAD, id='income-rate')
 
-    return country_graph_object, income_graph_object
+    return title, progress_bar, country_graph_object, income_graph_object
+
+
+def warm_up():
+    """
+    Cache the figures of every (question, continent)
+    """
+    for question, continent in survey_index:
+        survey_figures_cache.get_or_create(
+            (question, continent),
+            lambda: build_survey_figures(question, continent)
+        )
@@ -0,0 +1,92 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import plotly.io as pio
+
+# All caches created by the app, by name (e.g. to export their metrics)
+all_caches = {}
+
+
+class LRUCache:
+    """
+    Bounded LRU cache shared by all the threads of a worker
+    """
+
+    def __init__(self, name, maxsize=128):
+        self.name = name
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.build_seconds = 0.0
+        all_caches[name] = self
+
+    def _dump(self, value):
+        return value
+
+    def _load(self, stored):
+        return stored
+
+    def get_or_create(self, key, factory):
+        """
+        Return the value cached for `key`, or compute it with factory() and cache it
+        """
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._load(self._data[key])
+            self.misses += 1
+
+        # Computed outside the lock: two threads missing the same key concurrently may both compute it
+        start = time.perf_counter()
+        stored = self._dump(factory())
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.build_seconds += elapsed
+            self._data[key] = stored
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+        return self._load(stored)
+
+    def invalidate(self):
+        with self._lock:
+            self._data.clear()
+
+    def reset_lock(self):
+        """
+        Replace the lock, e.g. in a worker forked from a process where it may have been held
+        """
+        self._lock = threading.Lock()
+
+    def metrics(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'build_seconds': self.build_seconds
+            }
+
+
+class FigureCache(LRUCache):
+    """
+    LRUCache of figures (or dicts of figures) serialized to JSON. Cached figures are returned as dicts, directly usable
+    by dcc.Graph.
+    """
+
+    def _dump(self, value):
+        return None if value is None else pio.to_json(value, validate=False)
+
+    def _load(self, stored):
+        return None if stored is None else json.loads(stored)
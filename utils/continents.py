@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pycountry_convert as pc
+
+UNKNOWN_CONTINENT = 'Unknown'
+
+continent_dict = {
+    "NA": "North America",
+    "SA": "South America",
+    "AS": "Asia",
+    "AF": "Africa",
+    "OC": "Oceania",
+    "EU": "Europe",
+    "AQ": "Antarctica"
+}
+
+def get_continent_name(continent_code: str) -> str:
+    return continent_dict[continent_code]
+
+
+def country_code_to_continent_name(country_code):
+    try:
+        code_a2 = pc.country_alpha3_to_country_alpha2(country_code)
+        continent_code = pc.country_alpha2_to_continent_code(code_a2)
+        continent_name = get_continent_name(continent_code)
+        return continent_name
+    except (KeyError, TypeError):
+        return UNKNOWN_CONTINENT
+
+
+# ISO3 -> continent name, computed once for every code known by pycountry_convert. The codes used by Our World in Data
+# for historical countries, disputed territories and world aggregates (OWID_*) are not in it: they are unknown.
+continent_by_code = {
+    code: country_code_to_continent_name(code) for code in pc.map_country_alpha3_to_country_alpha2()
+}
+
+
+def get_continents(codes: pd.Series) -> pd.Series:
+    """
+    Map a Series of ISO3 codes to continent names. Each distinct code is looked up once in `continent_by_code`, and
+    missing or unknown codes are mapped to 'Unknown'.
+    """
+    codes_indices, unique_codes = pd.factorize(codes)
+    continents = np.array(
+        [continent_by_code.get(code, UNKNOWN_CONTINENT) for code in unique_codes] + [UNKNOWN_CONTINENT],
+        dtype=object
+    )
+    return pd.Series(continents.take(codes_indices), index=codes.index, name='Continent')
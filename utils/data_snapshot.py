@@ -0,0 +1,203 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the manifest format or the frames returned by the loaders in utils/process_data.py change,
+# so that snapshots compiled by a previous version are considered stale.
+SNAPSHOT_VERSION = 4
+SNAPSHOT_PATH = 'data/snapshot'
+MANIFEST_FILE = 'manifest.json'
+
+# MH_DATA_MMAP=1 maps the numeric columns of the snapshot in memory (read-only) instead of reading them, so that the
+# worker processes of gunicorn share the same pages of the OS cache rather than each holding a copy (see gunicorn.conf.py).
+DATA_MMAP = os.environ.get('MH_DATA_MMAP', '0') == '1'
+
+
+def file_fingerprint(file_path, with_hash=True):
+    stat = os.stat(file_path)
+    fingerprint = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+    if with_hash:
+        sha256 = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                sha256.update(chunk)
+        fingerprint['sha256'] = sha256.hexdigest()
+    return fingerprint
+
+
+@lru_cache(maxsize=None)
+def _categorical_dtype(categories: tuple, ordered: bool):
+    # One dtype per set of categories: frames read with the same categories share them
+    return pd.CategoricalDtype(list(categories), ordered=ordered)
+
+
+def _encode_column(series, column_file):
+    """
+    Save a column as a .npy array. Strings are stored as integer codes, their values being kept in the manifest.
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Codes keep the smallest dtype chosen by pandas (int8 or int16), which they are read back with
+        np.save(column_file, series.cat.codes.to_numpy())
+        return {
+            'kind': 'category',
+            'categories': series.cat.categories.tolist(),
+            'ordered': bool(series.cat.ordered)
+        }
+
+    if series.dtype == object:
+        codes, uniques = pd.factorize(series)
+        np.save(column_file, codes.astype('int32'))
+        return {'kind': 'string', 'categories': uniques.tolist()}
+
+    np.save(column_file, series.to_numpy())
+    return {'kind': 'numeric'}
+
+
+def _decode_column(column_spec, values):
+    if column_spec['kind'] == 'numeric':
+        return values
+
+    if column_spec['kind'] == 'category':
+        return pd.Categorical.from_codes(
+            values,
+            dtype=_categorical_dtype(tuple(column_spec['categories']), column_spec['ordered'])
+        )
+
+    categories = np.array(column_spec['categories'] + [np.nan], dtype=object)
+    return categories.take(values)
+
+
+def write_snapshot(frames: dict, source_paths: list, path=SNAPSHOT_PATH):
+    """
+    Compile every frame of `frames` ({key: DataFrame}) into a snapshot directory, along with the fingerprints of the
+    CSV files they were computed from.
+    """
+    tmp_path = f'{path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    sources = {source: file_fingerprint(source) for source in source_paths}
+    data_version = hashlib.sha256(
+        ''.join(sources[source]['sha256'] for source in sorted(sources)).encode()
+    ).hexdigest()[:16]
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'data_version': f'{SNAPSHOT_VERSION}-{data_version}',
+        'sources': sources,
+        'frames': {}
+    }
+
+    for i, (key, df) in enumerate(frames.items()):
+        frame_dir = os.path.join(tmp_path, str(i))
+        os.makedirs(frame_dir)
+
+        columns = []
+        for j, column in enumerate(df.columns):
+            column_spec = _encode_column(df[column], os.path.join(frame_dir, f'{j}.npy'))
+            columns.append({'name': column, **column_spec})
+
+        has_default_index = df.index.equals(pd.RangeIndex(len(df)))
+        if not has_default_index:
+            np.save(os.path.join(frame_dir, 'index.npy'), df.index.to_numpy())
+
+        manifest['frames'][key] = {
+            'dir': str(i),
+            'rows': len(df),
+            'columns': columns,
+            'has_index': not has_default_index
+        }
+
+    with open(os.path.join(tmp_path, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_manifest(path=SNAPSHOT_PATH):
+    try:
+        with open(os.path.join(path, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_snapshot_fresh(manifest, source_paths: list):
+    """
+    A snapshot is fresh if it was compiled by the current SNAPSHOT_VERSION from the same source files. Sources are
+    compared on mtime and size first, and only hashed when those differ (e.g. after a fresh checkout).
+    """
+    if not manifest or manifest.get('version') != SNAPSHOT_VERSION:
+        return False
+
+    if set(manifest['sources']) != set(source_paths):
+        return False
+
+    for source in source_paths:
+        expected = manifest['sources'][source]
+        try:
+            current = file_fingerprint(source, with_hash=False)
+        except OSError:
+            return False
+
+        if current == {'mtime_ns': expected['mtime_ns'], 'size': expected['size']}:
+            continue
+
+        if current['size'] != expected['size'] or file_fingerprint(source)['sha256'] != expected['sha256']:
+            logger.info('Snapshot is stale: %s has changed', source)
+            return False
+
+    return True
+
+
+def read_frame(manifest, key, path=SNAPSHOT_PATH, mmap=None):
+    """
+    Frame `key` of the snapshot. With mmap (DATA_MMAP by default), its numeric columns are read-only views of the
+    memory-mapped .npy files: pandas must not copy them, and they must not be modified in place.
+    """
+    mmap_mode = 'r' if (DATA_MMAP if mmap is None else mmap) else None
+    frame_spec = manifest['frames'][key]
+    frame_dir = os.path.join(path, frame_spec['dir'])
+
+    data = {
+        column_spec['name']: _decode_column(
+            column_spec,
+            np.load(os.path.join(frame_dir, f'{j}.npy'), mmap_mode=mmap_mode)
+        )
+        for j, column_spec in enumerate(frame_spec['columns'])
+    }
+    index = np.load(os.path.join(frame_dir, 'index.npy'), mmap_mode=mmap_mode) if frame_spec['has_index'] else None
+
+    # copy=False keeps one block per column instead of consolidating the columns (and copying the mapped arrays)
+    return pd.DataFrame(data, index=index, copy=False)
+
+
+def ensure_snapshot(path=SNAPSHOT_PATH):
+    """
+    Compile the snapshot unless it is fresh, e.g. in the gunicorn master before the workers map it
+    """
+    from utils.process_data import all_source_paths, compile_snapshot
+
+    if is_snapshot_fresh(read_manifest(path), all_source_paths):
+        return False
+
+    logger.info('Compiling the data snapshot in %s', path)
+    compile_snapshot(path)
+    return True
+
+
+if __name__ == '__main__':
+    from utils.process_data import compile_snapshot
+
+    logging.basicConfig(level=logging.INFO)
+    compile_snapshot()
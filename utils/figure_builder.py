@@ -0,0 +1,299 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# Set MH_FAST_FIGURES=1 to build the figures of the hot callbacks (choropleth, heatmap, survey bars, GDP bubbles) as
+# plain dicts, straight from the NumPy arrays of the frames, instead of going through plotly.express and the validators
+# of plotly.graph_objects. The dicts are the ones px would have returned (see to_plotly_json), and only hold lists,
+# strings, numbers and NumPy arrays, so that plotly's orjson engine serializes them without any copy.
+FAST_FIGURES = os.environ.get('MH_FAST_FIGURES', '0') == '1'
+
+# Properties whose name contains an underscore (the others are split on "_" like the magic underscores of plotly)
+UNDERSCORE_PROPERTIES = {'paper_bgcolor', 'plot_bgcolor'}
+
+# Defaults of plotly.express
+SIZE_MAX = 20
+ANIMATION_ARGS = {'mode': 'immediate', 'fromcurrent': True}
+
+
+@lru_cache(maxsize=None)
+def get_template():
+    """
+    Default template applied by plotly.express, as a dict (shared by all the figures: it must not be modified)
+    """
+    return pio.templates[pio.templates.default].to_plotly_json()
+
+
+def continuous_colorscale(color_scale):
+    return [[i / (len(color_scale) - 1), color] for i, color in enumerate(color_scale)]
+
+
+def _hovertemplate(labels: dict, prefix=''):
+    # Like px, a column used twice (e.g. as x and color) is only shown once, with its last reference
+    return prefix + '<br>'.join(f'{label}={reference}' for label, reference in labels.items()) + '<extra></extra>'
+
+
+def _split_magic_underscores(properties: dict):
+    nested = {}
+    for key, value in properties.items():
+        path = [key] if key in UNDERSCORE_PROPERTIES else key.split('_')
+        target = nested
+        for name in path[:-1]:
+            target = target.setdefault(name, {})
+        if isinstance(value, dict) and isinstance(target.get(path[-1]), dict):
+            deep_update(target[path[-1]], value)
+        else:
+            target[path[-1]] = value
+    return nested
+
+
+def deep_update(target: dict, updates: dict):
+    """
+    Update the nested dict `target` in place, the way fig.update_layout does: dicts are merged, and None resets the
+    property (an empty dict for objects such as titles). Like in plotly, a title can be given as a string.
+    """
+    for key, value in updates.items():
+        if key == 'title' and isinstance(value, str):
+            value = {'text': value}
+
+        if value is None:
+            if isinstance(target.get(key), dict):
+                target[key] = {}
+            else:
+                target.pop(key, None)
+        elif isinstance(value, dict):
+            if not isinstance(target.get(key), dict):
+                target[key] = {}
+            deep_update(target[key], value)
+        else:
+            target[key] = value
+    return target
+
+
+class FigureDict(dict):
+    """
+    Figure as a dict ({'data': [...], 'layout': {...}}), directly usable by dcc.Graph, with the update methods of
+    plotly.graph_objects.Figure used in utils/*.py
+    """
+
+    def __init__(self, data, layout, frames=None):
+        super().__init__(data=data, layout={'template': get_template(), **layout})
+        if frames is not None:
+            self['frames'] = frames
+
+    def update_layout(self, dict1=None, **kwargs):
+        deep_update(self['layout'], _split_magic_underscores({**(dict1 or {}), **kwargs}))
+        return self
+
+    def update_geos(self, dict1=None, **kwargs):
+        deep_update(self['layout']['geo'], _split_magic_underscores({**(dict1 or {}), **kwargs}))
+        return self
+
+    def update_traces(self, dict1=None, **kwargs):
+        updates = _split_magic_underscores({**(dict1 or {}), **kwargs})
+        for trace in self['data']:
+            deep_update(trace, updates)
+        return self
+
+    def to_plotly_json(self):
+        return self
+
+
+def choropleth(df: pd.DataFrame, locations, color, color_continuous_scale, custom_data):
+    """
+    Same figure as px.choropleth(df, locations=.., color=.., color_continuous_scale=.., custom_data=..)
+    """
+    trace = {
+        'coloraxis': 'coloraxis',
+        'customdata': df[custom_data].to_numpy(),
+        'geo': 'geo',
+        'hovertemplate': _hovertemplate({locations: '%{location}', color: '%{z}'}),
+        'locations': df[locations].to_numpy(),
+        'name': '',
+        'z': df[color].to_numpy(),
+        'type': 'choropleth'
+    }
+    layout = {
+        'geo': {'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]}, 'center': {}},
+        'coloraxis': {
+            'colorbar': {'title': {'text': color}},
+            'colorscale': continuous_colorscale(color_continuous_scale)
+        },
+        'legend': {'tracegroupgap': 0},
+        'margin': {'t': 60}
+    }
+    return FigureDict([trace], layout)
+
+
+def imshow(df: pd.DataFrame, color_continuous_scale):
+    """
+    Same figure as px.imshow(df, color_continuous_scale=.., aspect='auto') for a frame of numbers
+    """
+    x_label, y_label = df.columns.name, df.index.name
+    trace = {
+        'coloraxis': 'coloraxis',
+        'name': '0',
+        'x': df.columns.to_numpy(),
+        'y': df.index.to_numpy(),
+        'z': df.to_numpy(),
+        'type': 'heatmap',
+        'xaxis': 'x',
+        'yaxis': 'y',
+        'hovertemplate': f'{x_label}: %{{x}}<br>{y_label}: %{{y}}<br>color: %{{z}}<extra></extra>'
+    }
+    layout = {
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'title': {'text': x_label}},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], 'autorange': 'reversed', 'title': {'text': y_label}},
+        'coloraxis': {'colorscale': continuous_colorscale(color_continuous_scale)},
+        'margin': {'t': 60}
+    }
+    return FigureDict([trace], layout)
+
+
+def bar(df: pd.DataFrame, x, y, orientation, color, color_continuous_scale, height=None):
+    """
+    Same figure as px.bar(df, x=.., y=.., orientation=.., color=.., color_continuous_scale=.., height=..) where
+    `color` is a numeric column
+    """
+    trace = {
+        'alignmentgroup': 'True',
+        'hovertemplate': _hovertemplate({x: '%{x}', y: '%{y}', color: '%{marker.color}'}),
+        'legendgroup': '',
+        'marker': {'color': df[color].to_numpy(), 'coloraxis': 'coloraxis', 'pattern': {'shape': ''}},
+        'name': '',
+        'offsetgroup': '',
+        'orientation': orientation,
+        'showlegend': False,
+        'textposition': 'auto',
+        'x': df[x].to_numpy(),
+        'xaxis': 'x',
+        'y': df[y].to_numpy(),
+        'yaxis': 'y',
+        'type': 'bar'
+    }
+    layout = {
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'title': {'text': x}},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': y}},
+        'coloraxis': {
+            'colorbar': {'title': {'text': color}},
+            'colorscale': continuous_colorscale(color_continuous_scale)
+        },
+        'legend': {'tracegroupgap': 0},
+        'margin': {'t': 60},
+        'barmode': 'relative'
+    }
+    if height is not None:
+        layout['height'] = height
+    return FigureDict([trace], layout)
+
+
+def animated_scatter(
+        df: pd.DataFrame, x, y, animation_frame, animation_group, size, color, color_discrete_sequence, custom_data
+):
+    """
+    Same figure as px.scatter(df, x=.., y=.., animation_frame=.., animation_group=.., size=.., color=..,
+    color_discrete_sequence=.., custom_data=..) where `color` is a column of categories.
+    Frames and colors follow the order in which their values first appear in df, and the figure data is the first frame.
+    """
+    layout = {
+        'xaxis': {'anchor': 'y', 'domain': [0.0, 1.0], 'title': {'text': x}},
+        'yaxis': {'anchor': 'x', 'domain': [0.0, 1.0], 'title': {'text': y}},
+        'legend': {'tracegroupgap': 0, 'itemsizing': 'constant'},
+        'margin': {'t': 60}
+    }
+    if df.empty:
+        return FigureDict([], layout)
+
+    frame_codes, frame_values = pd.factorize(df[animation_frame])
+    color_codes, color_values = pd.factorize(df[color])
+    frame_names = [str(value) for value in frame_values]
+
+    marker = {'sizemode': 'area', 'sizeref': df[size].max() / SIZE_MAX ** 2, 'symbol': 'circle'}
+    columns = {
+        'x': df[x].to_numpy(),
+        'y': df[y].to_numpy(),
+        'size': df[size].to_numpy(),
+        'ids': df[animation_group].to_numpy(),
+        'customdata': df[custom_data].to_numpy()
+    }
+
+    # Rows of each (frame, color) group, in the order of df
+    order = np.lexsort((color_codes, frame_codes))
+    groups = frame_codes[order] * len(color_values) + color_codes[order]
+    boundaries = np.flatnonzero(np.diff(groups)) + 1
+
+    frames = [{'data': [], 'name': name} for name in frame_names]
+    for rows, group in zip(np.split(order, boundaries), groups[np.r_[0, boundaries]]):
+        i_frame, i_color = divmod(int(group), len(color_values))
+        color_value = color_values[i_color]
+        labels = {x: '%{x}', y: '%{y}', size: '%{marker.size}'}
+        prefix = f'{color}={color_value}<br>{animation_frame}={frame_names[i_frame]}<br>'
+
+        frames[i_frame]['data'].append({
+            'customdata': columns['customdata'][rows],
+            'hovertemplate': _hovertemplate(labels, prefix),
+            'ids': columns['ids'][rows],
+            'legendgroup': color_value,
+            'marker': {
+                'color': color_discrete_sequence[i_color % len(color_discrete_sequence)],
+                'size': columns['size'][rows],
+                **marker
+            },
+            'mode': 'markers',
+            'name': color_value,
+            'orientation': 'v',
+            'showlegend': True,
+            'x': columns['x'][rows],
+            'xaxis': 'x',
+            'y': columns['y'][rows],
+            'yaxis': 'y',
+            'type': 'scatter'
+        })
+
+    def animate(frame_names, duration):
+        return [
+            frame_names,
+            {
+                'frame': {'duration': duration, 'redraw': False},
+                **ANIMATION_ARGS,
+                'transition': {'duration': duration, 'easing': 'linear'}
+            }
+        ]
+
+    layout['legend'] = {'title': {'text': color}, **layout['legend']}
+    layout.update({
+        'updatemenus': [{
+            'buttons': [
+                {'args': animate(None, 500), 'label': '&#9654;', 'method': 'animate'},
+                {'args': animate([None], 0), 'label': '&#9724;', 'method': 'animate'}
+            ],
+            'direction': 'left',
+            'pad': {'r': 10, 't': 70},
+            'showactive': False,
+            'type': 'buttons',
+            'x': 0.1,
+            'xanchor': 'right',
+            'y': 0,
+            'yanchor': 'top'
+        }],
+        'sliders': [{
+            'active': 0,
+            'currentvalue': {'prefix': f'{animation_frame}='},
+            'len': 0.9,
+            'pad': {'b': 10, 't': 60},
+            'steps': [
+                {'args': animate([name], 0), 'label': name, 'method': 'animate'} for name in frame_names
+            ],
+            'x': 0.1,
+            'xanchor': 'left',
+            'y': 0,
+            'yanchor': 'top'
+        }]
+    })
+
+    # The traces of the figure are copies: fig.update_traces must not modify the first frame
+    data = [{**trace, 'marker': dict(trace['marker'])} for trace in frames[0]['data']]
+    return FigureDict(data, layout, frames)
@@ -1,13 +1,15 @@
 import plotly.express as px
+from utils import figure_builder
 from utils.utils_config import BG_TRANSPARENT
-from utils.process_data import country_code_to_continent_name
+from utils.continents import get_continents
 
 
 # FIGURE:
 def create_choropleth_fig(df, color_scale):
-    df['Continent'] = df['Code'].apply(country_code_to_continent_name)
+    df['Continent'] = get_continents(df['Code'])
 
-    fig = px.choropleth(
+    choropleth = figure_builder.choropleth if figure_builder.FAST_FIGURES else px.choropleth
+    fig = choropleth(
         df,
         locations='Code',
         color='Value',
@@ -39,6 +41,8 @@ def create_choropleth_fig(df, color_scale):
         margin={"r": 0, "t": 0, "l": 0, "b": 0},
         paper_bgcolor='rgba(0,0,0,0)',
         showlegend=False,
+        # Constant: the rotation of the globe, relaid out in the browser, is kept when the figure is updated
+        uirevision='choropleth',
         coloraxis_showscale=False,
         hoverlabel=dict(
             bgcolor='rgba(11, 6, 81, 0.8)',
@@ -0,0 +1,56 @@
+from functools import lru_cache
+
+import pandas as pd
+
+from utils.process_data import all_disorders_dataframes
+
+
+class CountryIndex:
+    """
+    Integer id of every entity of the prevalence data (its position in alphabetical order) and its continent.
+    The selected countries are stored in the browser as the list of their ids, in the order they were added.
+    """
+
+    def __init__(self, frames: list):
+        entities = pd.concat(
+            [df[['Entity', 'Continent']] for df in frames]
+        ).drop_duplicates(subset='Entity').sort_values('Entity')
+
+        self.names = entities['Entity'].to_numpy()
+        self.continents = entities['Continent'].to_numpy()
+        self._ids = {name: country_id for country_id, name in enumerate(self.names)}
+
+    def get_id(self, name: str) -> int:
+        return self._ids[name]
+
+    def get_valid_ids(self, data) -> list:
+        """
+        Stored ids if they are a list of ids of the index, an empty list otherwise
+        """
+        if isinstance(data, list) and all(
+                isinstance(country_id, int) and 0 <= country_id < len(self.names) for country_id in data
+        ):
+            return data
+        return []
+
+    def get_names(self, ids: list) -> list:
+        return self.names[ids].tolist()
+
+    def get_continents(self, ids: list) -> list:
+        return self.continents[ids].tolist()
+
+
+@lru_cache(maxsize=None)
+def get_country_index() -> CountryIndex:
+    return CountryIndex([disorder_df.prevalence_by_country for disorder_df in all_disorders_dataframes.values()])
+
+
+@lru_cache(maxsize=None)
+def get_continent_country_ids(disorder_name: str, continent: str) -> tuple:
+    """
+    Ids of the countries of a continent in the data of a disorder, in the order of the data
+    """
+    df = all_disorders_dataframes[disorder_name].prevalence_by_country
+    countries = df.loc[df['Continent'] == continent, 'Entity'].drop_duplicates()
+    country_index = get_country_index()
+    return tuple(country_index.get_id(country) for country in countries)
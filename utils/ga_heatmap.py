@@ -1,14 +1,18 @@
 import plotly.express as px
+from utils import figure_builder
 from utils.process_data import all_disorders_dataframes
 from utils.utils_config import BG_TRANSPARENT, HOVERLABEL_TEMPLATE
 
 
 def create_heatmap(df, disorder_name, entities, grouping_field):
-    fig = px.imshow(
-        df,
-        color_continuous_scale=all_disorders_dataframes[disorder_name].color_scale,
-        aspect='auto',
-    )
+    if figure_builder.FAST_FIGURES:
+        fig = figure_builder.imshow(df, color_continuous_scale=all_disorders_dataframes[disorder_name].color_scale)
+    else:
+        fig = px.imshow(
+            df,
+            color_continuous_scale=all_disorders_dataframes[disorder_name].color_scale,
+            aspect='auto',
+        )
 
     fig.update_layout(
         height=90*len(entities),
@@ -34,8 +38,8 @@ def create_heatmap(df, disorder_name, entities, grouping_field):
         )
     )
 
-    hovertemplate = f"{grouping_field}: %{{y}}<br>Year: %{{x}}<br>Normalized prevalence: %{{z}}<extra></extra>"
-    for trace in fig.data:
-        trace.hovertemplate = hovertemplate
+    fig.update_traces(
+        hovertemplate=f"{grouping_field}: %{{y}}<br>Year: %{{x}}<br>Normalized prevalence: %{{z}}<extra></extra>"
+    )
 
     return fig
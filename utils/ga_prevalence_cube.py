@@ -0,0 +1,88 @@
+import base64
+import os
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.continents import get_continents
+from utils.process_data import all_disorders_dataframes
+
+# Set MH_CLIENTSIDE_CHOROPLETH=1 to send the cube of the selected disorder to the browser (to_clientside), where the
+# choropleth is averaged over the year range: moving the year slider no longer makes any request to the server.
+CLIENTSIDE_CHOROPLETH = os.environ.get('MH_CLIENTSIDE_CHOROPLETH', '0') == '1'
+
+
+class PrevalenceCube:
+    """
+    Prefix sums over the years of the prevalence of each country (countries x years), built once per disorder.
+    The mean prevalence over any [start, end] year range is then a vectorized subtraction over the countries.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        # Same countries as groupby(['Entity', 'Code']): rows without code are dropped
+        pivot = df.dropna(subset=['Code']).assign(Present=1).pivot(
+            index=['Entity', 'Code'],
+            columns='Year',
+            values=['Value', 'Present']
+        )
+        values = pivot['Value'].to_numpy(dtype='float64')
+        has_value = ~np.isnan(values)
+        has_row = pivot['Present'].notna().to_numpy()
+
+        self.years = pivot['Value'].columns.to_numpy()
+        self.entities = pivot.index.get_level_values('Entity').to_numpy()
+        self.codes = pivot.index.get_level_values('Code').to_numpy()
+        self.continents = get_continents(pd.Series(self.codes)).to_numpy()
+
+        def prefix_sum(array):
+            return np.concatenate([np.zeros((len(array), 1)), np.cumsum(array, axis=1)], axis=1)
+
+        self._value_sums = prefix_sum(np.where(has_value, values, 0))
+        self._value_counts = prefix_sum(has_value)
+        self._row_counts = prefix_sum(has_row)
+
+        # Compact copy of the prevalence itself, for the browser
+        self._values = values.astype('float32')
+        self._has_row = has_row.astype('uint8')
+
+    def get_average(self, year_start, year_end):
+        """
+        Mean prevalence per country from year_start to year_end (both included), as a frame with the columns
+        Entity, Code, Continent and Value. Countries without any row in the range are left out.
+        """
+        i_start = np.searchsorted(self.years, year_start, side='left')
+        i_end = np.searchsorted(self.years, year_end, side='right')
+
+        in_range = (self._row_counts[:, i_end] - self._row_counts[:, i_start]) > 0
+        sums = self._value_sums[in_range, i_end] - self._value_sums[in_range, i_start]
+        counts = self._value_counts[in_range, i_end] - self._value_counts[in_range, i_start]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            means = np.where(counts > 0, sums / counts, np.nan)
+
+        return pd.DataFrame({
+            'Entity': self.entities[in_range],
+            'Code': self.codes[in_range],
+            'Continent': self.continents[in_range],
+            'Value': means
+        })
+
+    def to_clientside(self):
+        """
+        Cube as a JSON-serializable dict for the browser: the prevalence (countries x years) as a base64-encoded
+        Float32Array, NaN where the country has a row without value, and whether each row exists as a Uint8Array
+        """
+        return {
+            'years': self.years.tolist(),
+            'entities': self.entities.tolist(),
+            'codes': self.codes.tolist(),
+            'continents': self.continents.tolist(),
+            'values': base64.b64encode(self._values.tobytes()).decode('ascii'),
+            'rows': base64.b64encode(self._has_row.tobytes()).decode('ascii')
+        }
+
+
+@lru_cache(maxsize=None)
+def get_prevalence_cube(disorder_name: str) -> PrevalenceCube:
+    return PrevalenceCube(all_disorders_dataframes[disorder_name].prevalence_by_country)
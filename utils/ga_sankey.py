@@ -1,6 +1,8 @@
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 from plotly import colors
+from utils.ga_utils import top_n_per_group
 from utils.utils_config import BG_TRANSPARENT
 
 
@@ -55,57 +57,52 @@ def create_sankey(
     df_mean_sum_filtered_category_prevalence['EstimatedAffected'] = df_mean_sum_filtered_category_prevalence[
         'EstimatedAffected'].round().astype(int)
 
-    # Update categories with estimated affected people
-    for index, row in df_mean_sum_filtered_category_prevalence.iterrows():
-        sum_of_prevalences = sum(row[category] for category in filtered_categories)
-        for category in filtered_categories:
-            if sum_of_prevalences > 0:
-                row[category] = row['EstimatedAffected'] * (row[category] / sum_of_prevalences)
-        df_mean_sum_filtered_category_prevalence.loc[index, filtered_categories] = row[filtered_categories]
-
-    if country_filter_selection == 'top-5':
-        top_5 = df_mean_sum_filtered_category_prevalence.groupby('Continent').apply(
-            lambda x: x.nlargest(5, 'GlobalPrevalence')).reset_index(drop=True)
-        max_prevalence_per_continent = top_5.groupby('Continent')['GlobalPrevalence'].max()
-        df_with_max = top_5.merge(max_prevalence_per_continent.rename('MaxPrevalence'), on='Continent')
-        df_mean_sum_filtered_category_prevalence = df_with_max.sort_values(
-            by=['MaxPrevalence', 'Continent', 'GlobalPrevalence'],
-            ascending=[False, True, False]
+    # Update categories with estimated affected people, distributed proportionally to the prevalence of each category
+    # (countries whose categories sum to 0 are left unchanged)
+    categories_prevalence = df_mean_sum_filtered_category_prevalence[filtered_categories]
+    sum_of_prevalences = sum(categories_prevalence[category] for category in filtered_categories)
+    estimated_affected_per_category = categories_prevalence.div(sum_of_prevalences, axis=0).mul(
+        df_mean_sum_filtered_category_prevalence['EstimatedAffected'], axis=0)
+    df_mean_sum_filtered_category_prevalence[filtered_categories] = categories_prevalence.mask(
+        sum_of_prevalences > 0, estimated_affected_per_category, axis=0)
+
+    # 'top-N': the N countries with the highest prevalence of each continent, continents ordered by their highest one
+    if country_filter_selection.startswith('top-'):
+        df_mean_sum_filtered_category_prevalence = top_n_per_group(
+            df_mean_sum_filtered_category_prevalence,
+            group_column='Continent',
+            value_column='GlobalPrevalence',
+            n=int(country_filter_selection.split('-')[1])
         )
 
+    links_df = df_mean_sum_filtered_category_prevalence
+    n_categories = len(filtered_categories)
+    links_country_indices = links_df['Entity'].map(country_indices).to_numpy()
+    links_colors = links_df['Continent'].map(continent_to_color).tolist()
+    links_customdata = links_df[['Continent', 'Entity', 'GlobalPrevalence']].to_numpy(dtype=object).tolist()
 
     # Flow from continents to countries
-    for _, row in df_mean_sum_filtered_category_prevalence.iterrows():
-        data_sankey['source'].append(continent_indices[row['Continent']])
-        data_sankey['target'].append(country_indices[row['Entity']])
-        data_sankey['value'].append(row['EstimatedAffected'])
-        data_sankey['color'].append(continent_to_color[row['Continent']])
-        data_sankey['customdata'].append([row['Continent'], row['Entity'], row['GlobalPrevalence']])
-
-    # Flow from countries to age categories
-    for _, row in df_mean_sum_filtered_category_prevalence.iterrows():
-        country_index = country_indices[row['Entity']]
-        for category in filtered_categories:
-            data_sankey['source'].append(country_index)
-            data_sankey['target'].append(filtered_categories_indices[category])
-            data_sankey['value'].append(row[category])
-            data_sankey['color'].append(continent_to_color[row['Continent']])
-            data_sankey['customdata'].append([row['Continent'], row['Entity'], row['GlobalPrevalence']])
-
-    # Colors for nodes
-    node_colors = []
-    for label in data_sankey['label']:
-        if label in continents:
-            # Color for node continent
-            node_colors.append(continent_to_color[label])
-        elif label in countries:
-            # Color for node country
-            continent = filtered_df[filtered_df['Entity'] == label]['Continent'].iloc[0]
-            node_colors.append(continent_to_color[continent])
-        else:
-            # Color for node age categories
-            color_categories = color_categories or colors.qualitative.Pastel1
-            node_colors.extend(color_categories)
+    data_sankey['source'] = links_df['Continent'].map(continent_indices).tolist()
+    data_sankey['target'] = links_country_indices.tolist()
+    data_sankey['value'] = links_df['EstimatedAffected'].tolist()
+    data_sankey['color'] = links_colors
+    data_sankey['customdata'] = links_customdata
+
+    # Flow from countries to age categories (one link per country and category, row by row)
+    data_sankey['source'] += np.repeat(links_country_indices, n_categories).tolist()
+    data_sankey['target'] += [filtered_categories_indices[category] for category in filtered_categories] * len(links_df)
+    data_sankey['value'] += links_df[filtered_categories].to_numpy(dtype='float64').ravel().tolist()
+    data_sankey['color'] += [color for color in links_colors for _ in range(n_categories)]
+    data_sankey['customdata'] += [customdata for customdata in links_customdata for _ in range(n_categories)]
+
+    # Colors for nodes: continents, countries (color of their continent) then categories
+    country_to_continent = filtered_df.drop_duplicates('Entity').set_index('Entity')['Continent'].to_dict()
+    color_categories = color_categories or colors.qualitative.Pastel1
+    node_colors = [
+        continent_to_color[label] if label in continent_to_color else continent_to_color[country_to_continent[label]]
+        for label in continents + countries
+    ]
+    node_colors.extend(color_categories * n_categories)
 
     # Plot Sankey
     fig = go.Figure(data=[go.Sankey(
@@ -0,0 +1,54 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from utils.process_data import all_disorders_dataframes, get_population_index
+
+
+class SankeyTable:
+    """
+    Prevalence by sex or by age category of a disorder joined once with the population and the global prevalence of
+    each country (Entity, Code, Year, categories, Continent, Population, GlobalPrevalence), sorted by year so that the
+    rows of a year are a slice.
+    """
+
+    def __init__(self, df: pd.DataFrame, prevalence_by_country: pd.DataFrame):
+        # Columns between Year and Continent
+        self.categories = df.columns[3:-1].tolist()
+
+        population = get_population_index().rename('Population')
+        global_prevalence = prevalence_by_country.set_index(['Entity', 'Year'])['Value'].rename('GlobalPrevalence')
+        table = df.join(population, on=['Entity', 'Year']).join(global_prevalence, on=['Entity', 'Year'])
+
+        self._df = table.sort_values('Year', kind='stable').reset_index(drop=True)
+        self._years = self._df['Year'].to_numpy()
+
+    def _get_rows(self, entities: list, year_start, year_end) -> pd.DataFrame:
+        start = np.searchsorted(self._years, year_start, side='left')
+        end = np.searchsorted(self._years, year_end, side='right')
+        rows = self._df.iloc[start:end]
+        return rows[rows['Entity'].isin(entities)]
+
+    def get_year_range(self, entities: list, year_range: list):
+        """
+        First and last years with data for the countries within year_range (None if there is none)
+        """
+        years = self._get_rows(entities, *year_range)['Year']
+        if years.empty:
+            return None
+        return int(years.min()), int(years.max())
+
+    def get_year(self, entities: list, year: int) -> pd.DataFrame:
+        """
+        Rows of the countries in `year`, in the order of the data. Countries without population or global prevalence
+        are left out.
+        """
+        return self._get_rows(entities, year, year).dropna(subset=['Population', 'GlobalPrevalence'])
+
+
+@lru_cache(maxsize=None)
+def get_sankey_table(disorder_name: str, by_sex: bool) -> SankeyTable:
+    disorder_df = all_disorders_dataframes[disorder_name]
+    df = disorder_df.prevalence_by_sex if by_sex else disorder_df.prevalence_by_age
+    return SankeyTable(df, disorder_df.prevalence_by_country)
@@ -200,7 +200,9 @@ tabs_sankey = html.Div(
                 dmc.Divider(label='Country Display Preferences', mt=75),
                 dmc.RadioGroup(
                     [
+                        dmc.Radio('Top 3', value='top-3'),
                         dmc.Radio('Top 5', value='top-5'),
+                        dmc.Radio('Top 10', value='top-10'),
                         dmc.Radio('All', value='all')
                     ],
                     id='sankey-country-filter-selection',
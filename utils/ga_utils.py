@@ -1,8 +1,13 @@
+import warnings
 import dash_mantine_components as dmc
 from dash_iconify import DashIconify
 import numpy as np
+import pandas as pd
 import dash_extensions as de
 
+from utils.ga_country_index import get_country_index
+from utils.ga_prevalence_cube import get_prevalence_cube
+from utils.process_data import all_disorders_dataframes
 from utils.utils_config import MAIN_TITLE_COLOR
 
 url = 'https://lottie.host/f2933ddb-a454-4e35-bea0-de15f496c6c3/tgIm6ZNww2.json'
@@ -37,10 +42,41 @@ def create_country_title(text, id='', animation=None, order=2):
     )
 
 
-def calculate_slope(y_values):
-    x_values = np.arange(len(y_values))
-    slope, *_ = np.polyfit(x_values, y_values, 1)
-    return slope
+def calculate_slopes(df_pivot):
+    """
+    Least-squares slope of each row of df_pivot (entities x years), computed in closed form for all rows at once.
+    As with np.polyfit on the values of each row, x is the position of the value and missing years are skipped.
+    """
+    y_values = df_pivot.to_numpy(dtype='float64')
+    has_value = ~np.isnan(y_values)
+    n_values = has_value.sum(axis=1, keepdims=True)
+
+    x_values = np.cumsum(has_value, axis=1) - 1
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x_centered = np.where(has_value, x_values - (n_values - 1) / 2, 0)
+        y_centered = np.where(has_value, y_values - np.nansum(y_values, axis=1, keepdims=True) / n_values, 0)
+
+        numerator = (x_centered * y_centered).sum(axis=1)
+        denominator = (x_centered ** 2).sum(axis=1)
+        slopes = np.where(denominator > 0, numerator / denominator, 0)
+
+    return pd.Series(slopes, index=df_pivot.index)
+
+
+def normalize_rows(df_pivot):
+    """
+    Min-max normalization of each row of df_pivot to [0, 1], ignoring missing values (rows with a single distinct
+    value are NaN)
+    """
+    values = df_pivot.to_numpy(dtype='float64')
+    with np.errstate(invalid='ignore', divide='ignore'), warnings.catch_warnings():
+        # All-NaN rows
+        warnings.simplefilter('ignore', RuntimeWarning)
+        row_min = np.nanmin(values, axis=1, keepdims=True)
+        row_max = np.nanmax(values, axis=1, keepdims=True)
+        normalized = (values - row_min) / (row_max - row_min)
+
+    return pd.DataFrame(normalized, index=df_pivot.index, columns=df_pivot.columns)
 
 
 def make_edit_icon(icon, id, tooltip, color=None):
@@ -67,13 +103,53 @@ def filter_dataframe(df, entities, year_range, column_to_filter):
         return df.query(f'{column_to_filter} in @entities and Year == @year')
 
 
-def get_last_added_entity(last_entity: list):
-    last_continent, last_country = last_entity[-1][0], last_entity[-1][1]
-    return last_country, last_continent
+def get_average_prevalence(dataset_key: dict):
+    """
+    Resolve a dataset key {'disorder', 'year_range'} to the mean prevalence per country over the year range
+    """
+    return get_prevalence_cube(dataset_key['disorder']).get_average(*dataset_key['year_range'])
+
+
+def get_annual_prevalence(dataset_key: dict):
+    """
+    Resolve a dataset key {'disorder', 'year_range', 'entities'} to the annual prevalence of the selected countries
+    (entities are country ids, see CountryIndex)
+    """
+    df = all_disorders_dataframes[dataset_key['disorder']].prevalence_by_country
+    entities = get_country_index().get_names(dataset_key['entities'])
+    return filter_dataframe(df, entities, dataset_key['year_range'], 'Entity')
+
+
+def top_n_per_group(df: pd.DataFrame, group_column: str, value_column: str, n: int) -> pd.DataFrame:
+    """
+    Rows of the n largest values of value_column within each group, in a single sort: groups ordered by their largest
+    value (then by name), and rows by decreasing value. Ties keep the order of df.
+    """
+    group_max = df.groupby(group_column, observed=True)[value_column].transform('max')
+    ranked = df.assign(_GroupMax=group_max).sort_values(
+        by=['_GroupMax', group_column, value_column],
+        ascending=[False, True, False],
+        kind='stable'
+    )
+    return ranked.groupby(group_column, observed=True, sort=False).head(n).drop(columns='_GroupMax')
+
+
+def get_heatmap_pivots(dataset_key: dict) -> dict:
+    """
+    Normalized annual prevalence of the heatmap (entities x years) for a dataset key, both by country ('Entity') and by
+    continent ('Continent'), with the rows sorted by decreasing slope
+    """
+    filtered_df = get_annual_prevalence(dataset_key)
+    # Mean per Continent and Year before computing the slope
+    continent_df = filtered_df.groupby(['Continent', 'Year'], observed=True)['Value'].mean().reset_index()
 
+    pivots = {}
+    for grouping_field, df in [('Entity', filtered_df), ('Continent', continent_df)]:
+        df_pivot = df.pivot(index=grouping_field, columns='Year', values='Value')
+        sorted_entities = calculate_slopes(df_pivot).sort_values(ascending=False).index
+        pivots[grouping_field] = normalize_rows(df_pivot).reindex(sorted_entities)
 
-def update_last_entity(last_entity: list, new_continent: str, new_country: str):
-    last_entity.append([new_continent, new_country])
+    return pivots
 
 
 def clean_duplicated_columns(df):
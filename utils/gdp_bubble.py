@@ -1,6 +1,8 @@
 import plotly.express as px
 from plotly import colors
 
+from utils import figure_builder
+
 from utils.utils_config import BG_TRANSPARENT, HOVERLABEL_TEMPLATE
 
 
@@ -21,7 +23,11 @@ def create_bubble(df, switcher):
         custom_data = ['Continent', 'Entity']
         hover_template = "<b>%{customdata[1]}</b><br>GDP: %{x}<br>Prevalence: %{y:.2f}%"
 
-    fig = px.scatter(
+    # Plotly Express orders the traces of categorical columns by their categories, not by their order in df
+    df = df.astype({'Entity': 'object', 'Continent': 'object'})
+
+    scatter = figure_builder.animated_scatter if figure_builder.FAST_FIGURES else px.scatter
+    fig = scatter(
         df,
         x='GDP',
         y='Prevalence',
@@ -1,5 +1,7 @@
+import json
 import pandas as pd
 import plotly.express as px
+import plotly.io as pio
 from utils.process_data import all_disorders_dataframes
 from utils.utils_config import BG_TRANSPARENT
 
@@ -20,7 +22,7 @@ concatenate_df = pd.concat(
      ],
     ignore_index=True
 )
-prevalence_by_disorder = concatenate_df.groupby('Disorder')['Value'].mean().reset_index()
+prevalence_by_disorder = concatenate_df.groupby('Disorder', observed=True)['Value'].mean().reset_index()
 
 # MAPPING FOR COLORS ASSOCIATED WITH DISORDER:
 colors = {
@@ -120,3 +122,10 @@ graph_functions = {
     'Eating': lambda: plot_yearly_prevalence(all_disorders_dataframes['Eating'].prevalence_by_year, colors['Eating']),
     'Schizophrenia': lambda: plot_yearly_prevalence(all_disorders_dataframes['Schizophrenia'].prevalence_by_year, colors['Schizophrenia']),
 }
+
+# Sparklines built once and serialized: a hover only sends the figure of the disorder
+sparkline_figures = {
+    disorder_name: json.loads(pio.to_json(build_figure(), validate=False))
+    for disorder_name, build_figure in graph_functions.items()
+}
+estimated_people_affected = dict(zip(prevalence_by_disorder['Disorder'], prevalence_by_disorder['EstimatedPeopleAffected']))
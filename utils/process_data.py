@@ -1,7 +1,11 @@
+import threading
 import pandas as pd
-import pycountry_convert as pc
 import plotly.express as px
 from collections import namedtuple
+from functools import lru_cache
+
+from utils.continents import get_continents
+from utils.data_snapshot import SNAPSHOT_PATH, write_snapshot, read_manifest, is_snapshot_fresh, read_frame
 
 pd.set_option('display.max_columns', None)
 
@@ -30,6 +34,11 @@ file_age_paths = [
     f'{DATA_AGE_PATH}/schizophrenia-prevalence-by-age.csv',
 ]
 
+# Dtypes of the loaded frames (compact_dtypes): repeated strings are categoricals, whose categories are shared by all
+# the frames of the snapshot, and years are int16. Values stay float64, as the normalizations and sums computed from
+# them.
+CATEGORY_COLUMNS = ['Entity', 'Code', 'Continent', 'Disorder']
+
 file_sex_paths = [
     f'{DATA_SEX_PATH}/anxiety-disorders-prevalence-males-vs-females.csv',
     f'{DATA_SEX_PATH}/bipolar-disorders-prevalence-males-vs-females.csv',
@@ -38,45 +47,50 @@ file_sex_paths = [
     f'{DATA_SEX_PATH}/schizophrenia-prevalence-males-vs-females.csv',
 ]
 
-continent_dict = {
-    "NA": "North America",
-    "SA": "South America",
-    "AS": "Asia",
-    "AF": "Africa",
-    "OC": "Oceania",
-    "EU": "Europe",
-    "AQ": "Antarctica"
-}
+
+def compact_dtypes(df):
+    """
+    Convert the columns of a parsed frame to compact dtypes (see CATEGORY_COLUMNS)
+    """
+    for column in df.columns:
+        if column in CATEGORY_COLUMNS:
+            df[column] = df[column].astype('category')
+        elif column == 'Year':
+            df[column] = df[column].astype('int16')
+    return df
 
 
-def get_continent_name(continent_code: str) -> str:
-    return continent_dict[continent_code]
+def share_categories(frames: dict):
+    """
+    Give the categorical columns of the same name the same categories in all the frames (sorted union of their values),
+    so that the frames can be joined on them without going back to strings
+    """
+    for column in CATEGORY_COLUMNS:
+        series = [df[column] for df in frames.values() if column in df.columns]
+        dtype = pd.CategoricalDtype(sorted(set().union(*(s.cat.categories for s in series))))
+        for df in frames.values():
+            if column in df.columns:
+                df[column] = df[column].astype(dtype)
+    return frames
 
 
-def country_code_to_continent_name(country_code):
-    try:
-        code_a2 = pc.country_alpha3_to_country_alpha2(country_code)
-        continent_code = pc.country_alpha2_to_continent_code(code_a2)
-        continent_name = get_continent_name(continent_code)
-        return continent_name
-    except (KeyError, TypeError):
-        return 'Unknown'
+def get_prevalence_by_year(df):
+    return df.groupby(['Year', 'Disorder'], observed=True)['Value'].mean().reset_index().round(3)
 
 
 def process_general_data(file_path, disorder_name):
     df = pd.read_csv(file_path)
     df.rename(columns={df.columns[-1]: 'Value'}, inplace=True)
     df['Disorder'] = disorder_name
-    df['Continent'] = df['Code'].apply(country_code_to_continent_name)
-    grouped_by_year = df.groupby(['Year', 'Disorder'])['Value'].mean().reset_index().round(3)
-    return df, grouped_by_year
+    df['Continent'] = get_continents(df['Code'])
+    return df
 
 
 def process_gdp_data(file_path, disorder_name=None):
     df = pd.read_csv(file_path)
     df.rename(columns={df.columns[3]: 'Prevalence', df.columns[4]: 'GDP'}, inplace=True)
     df = df.dropna(subset=['Prevalence', 'GDP'])
-    df['Continent'] = df['Code'].apply(country_code_to_continent_name)
+    df['Continent'] = get_continents(df['Code'])
     return df
 
 
@@ -102,7 +116,7 @@ def process_prevalence_by_age_data(file_path):
         df[new_age] = df[cols_to_mean].mean(axis=1)
 
     df = df.drop(short_cols_names, axis=1)
-    df['Continent'] = df['Code'].apply(country_code_to_continent_name)
+    df['Continent'] = get_continents(df['Code'])
     return df
 
 
@@ -113,100 +127,213 @@ def process_prevalence_by_sex_data(file_path):
     first_cols_names = df.columns[:3].tolist()
     new_cols_names = first_cols_names + sex_cols
     df_cleaned.columns = new_cols_names
-    df_cleaned['Continent'] = df_cleaned['Code'].apply(country_code_to_continent_name)
+    df_cleaned['Continent'] = get_continents(df_cleaned['Code'])
     return df_cleaned
 
 
-def get_population_data(entities=None, year=None):
-    df_pop = pd.read_csv(file_sex_paths[0])
-    df_pop = df_pop.drop(
-        [
-            'Anxiety disorders (share of population) - Sex: Male - Age: All ages',
-            'Anxiety disorders (share of population) - Sex: Female - Age: Age-standardized',
-            'Continent'
-        ],
-        axis=1
-    )
-    df_pop = df_pop.rename(columns={'Population (historical estimates)': 'Population'})
-    df_pop['Continent'] = df_pop['Code'].apply(country_code_to_continent_name)
+def process_population_data(file_path):
+    df_pop = pd.read_csv(file_path, usecols=['Entity', 'Year', 'Population (historical estimates)'])
+    return df_pop.rename(columns={'Population (historical estimates)': 'Population'})
 
-    if year and entities:
-        df_pop = df_pop.query('Entity in @entities and Year == @year')
 
-    return df_pop
+# Disorder Prevalence Data:
+FRAME_FIELDS = [
+    'prevalence_by_country',
+    'prevalence_by_year',
+    'prevalence_and_gdp',
+    'prevalence_by_age',
+    'prevalence_by_sex'
+]
 
 
-# Disorder Prevalence Data:
-DisorderDataframe = namedtuple(
-    'DisorderDataframe',
-    [
-        'disorder_name',
-        'prevalence_by_country',
-        'prevalence_by_year',
-        'prevalence_and_gdp',
-        'prevalence_by_age',
-        'prevalence_by_sex',
-        'pastel_color',
-        'color_scale'
-    ]
-)
+class DisorderDataframe:
+    """
+    Frames of a disorder, with the same attributes as a namedtuple
+    (disorder_name, prevalence_by_country, .., pastel_color, color_scale).
+    Each frame is loaded the first time it is accessed and then kept in memory. Frames without data are None.
+    """
 
-anxiety_disorder = DisorderDataframe(
-    'Anxiety',
-    *[process_general_data(file_paths[0], 'Anxiety')[i] for i in range(2)],
-    process_gdp_data(file_gdp_paths[0]),
-    process_prevalence_by_age_data(file_age_paths[0]),
-    process_prevalence_by_sex_data(file_sex_paths[0]),
-    '#7FC6A4',
-    px.colors.sequential.Greens
-)
+    def __init__(self, disorder_name, frame_loaders: dict, pastel_color, color_scale):
+        self.disorder_name = disorder_name
+        self.pastel_color = pastel_color
+        self.color_scale = color_scale
+        self._frame_loaders = frame_loaders
+        # Reentrant: loading prevalence_by_year accesses prevalence_by_country
+        self._lock = threading.RLock()
 
-bipolar_disorder = DisorderDataframe(
-    'Bipolar',
-    *[process_general_data(file_paths[1], 'Bipolar')[i] for i in range(2)],
-    None,
-    process_prevalence_by_age_data(file_age_paths[1]),
-    process_prevalence_by_sex_data(file_sex_paths[1]),
-    '#FF6B6B',
-    px.colors.sequential.Reds
-)
+    def __getattr__(self, name):
+        # Only called when `name` has not been loaded yet
+        frame_loaders = self.__dict__.get('_frame_loaders', {})
+        if name not in frame_loaders:
+            raise AttributeError(f"'DisorderDataframe' object has no attribute '{name}'")
 
-depressive_disorder = DisorderDataframe(
-    'Depressive',
-    *[process_general_data(file_paths[2], 'Depressive')[i] for i in range(2)],
-    process_gdp_data(file_gdp_paths[1]),
-    process_prevalence_by_age_data(file_age_paths[2]),
-    process_prevalence_by_sex_data(file_sex_paths[2]),
-    '#FFD580',
-    px.colors.sequential.Oranges
-)
-eating_disorder = DisorderDataframe(
-    'Eating',
-    *[process_general_data(file_paths[3], 'Eating')[i] for i in range(2)],
-    None,
-    None,
-    process_prevalence_by_sex_data(file_sex_paths[3]),
-    '#C5A3FF',
-    px.colors.sequential.Magenta
-)
+        with self._lock:
+            if name not in self.__dict__:
+                loader = frame_loaders[name]
+                self.__dict__[name] = loader() if loader else None
+
+        return self.__dict__[name]
+
+    def __repr__(self):
+        loaded = [field for field in FRAME_FIELDS if field in self.__dict__]
+        return f'DisorderDataframe({self.disorder_name!r}, loaded={loaded})'
 
-schizophrenia_disorder = DisorderDataframe(
-    'Schizophrenia',
-    *[process_general_data(file_paths[4], 'Schizophrenia')[i] for i in range(2)],
-    None,
-    process_prevalence_by_age_data(file_age_paths[3]),
-    process_prevalence_by_sex_data(file_sex_paths[4]),
-    '#A0D2EB',
-    px.colors.sequential.Bluyl,
+    def warm_up(self):
+        for field in FRAME_FIELDS:
+            getattr(self, field)
+        return self
+
+    def reset_lock(self):
+        self._lock = threading.RLock()
+
+
+DisorderSource = namedtuple(
+    'DisorderSource',
+    ['general_path', 'gdp_path', 'age_path', 'sex_path', 'pastel_color', 'color_scale']
 )
 
-all_disorders_dataframes = {
-    'Anxiety': anxiety_disorder,
-    'Depressive': depressive_disorder,
-    'Bipolar': bipolar_disorder,
-    'Eating': eating_disorder,
-    'Schizophrenia': schizophrenia_disorder
+disorders_sources = {
+    'Anxiety': DisorderSource(
+        file_paths[0], file_gdp_paths[0], file_age_paths[0], file_sex_paths[0], '#7FC6A4', px.colors.sequential.Greens
+    ),
+    'Depressive': DisorderSource(
+        file_paths[2], file_gdp_paths[1], file_age_paths[2], file_sex_paths[2], '#FFD580', px.colors.sequential.Oranges
+    ),
+    'Bipolar': DisorderSource(
+        file_paths[1], None, file_age_paths[1], file_sex_paths[1], '#FF6B6B', px.colors.sequential.Reds
+    ),
+    'Eating': DisorderSource(
+        file_paths[3], None, None, file_sex_paths[3], '#C5A3FF', px.colors.sequential.Magenta
+    ),
+    'Schizophrenia': DisorderSource(
+        file_paths[4], None, file_age_paths[3], file_sex_paths[4], '#A0D2EB', px.colors.sequential.Bluyl
+    ),
+}
+
+all_source_paths = sorted({
+    path for source in disorders_sources.values() for path in source[:4] if path is not None
+})
+
+
+def get_frame_parsers(disorder_name):
+    """
+    Functions computing each frame of a disorder from its CSV files (None when there is no data for the disorder)
+    """
+    source = disorders_sources[disorder_name]
+    return {
+        'prevalence_by_country': lambda: compact_dtypes(process_general_data(source.general_path, disorder_name)),
+        'prevalence_by_year': lambda: get_prevalence_by_year(
+            all_disorders_dataframes[disorder_name].prevalence_by_country
+        ),
+        'prevalence_and_gdp': source.gdp_path and (lambda: compact_dtypes(process_gdp_data(source.gdp_path))),
+        'prevalence_by_age': source.age_path and (
+            lambda: compact_dtypes(process_prevalence_by_age_data(source.age_path))
+        ),
+        'prevalence_by_sex': lambda: compact_dtypes(process_prevalence_by_sex_data(source.sex_path)),
+    }
+
+
+def parse_population():
+    return compact_dtypes(process_population_data(file_sex_paths[0]))
+
+
+def compile_snapshot(path=SNAPSHOT_PATH):
+    """
+    Build step: parse the CSV files once and compile all the frames into a binary snapshot loaded at startup
+    """
+    frames = {
+        f'{disorder_name}/{field}': parser()
+        for disorder_name in disorders_sources
+        for field, parser in get_frame_parsers(disorder_name).items()
+        if parser
+    }
+    frames['population'] = parse_population()
+    return write_snapshot(share_categories(frames), all_source_paths, path=path)
+
+
+@lru_cache(maxsize=None)
+def get_snapshot_manifest(path=SNAPSHOT_PATH):
+    """
+    Manifest of the snapshot if it is fresh, else None (the frames are then parsed from the CSV files)
+    """
+    manifest = read_manifest(path)
+    return manifest if is_snapshot_fresh(manifest, all_source_paths) else None
+
+
+def get_data_version(path=SNAPSHOT_PATH):
+    """
+    Token identifying the data in use. It does not change during the life of the process, which keeps the frames it
+    has loaded.
+    """
+    manifest = get_snapshot_manifest(path)
+    return manifest['data_version'] if manifest else 'csv'
+
+
+def load_frame(key, parser, path=SNAPSHOT_PATH):
+    manifest = get_snapshot_manifest(path)
+    if manifest and key in manifest['frames']:
+        return read_frame(manifest, key, path=path)
+    return parser()
 
+
+def get_frame_loaders(disorder_name):
+    return {
+        field: parser and (lambda key=f'{disorder_name}/{field}', parser=parser: load_frame(key, parser))
+        for field, parser in get_frame_parsers(disorder_name).items()
+    }
+
+
+all_disorders_dataframes = {
+    disorder_name: DisorderDataframe(
+        disorder_name,
+        get_frame_loaders(disorder_name),
+        source.pastel_color,
+        source.color_scale
+    )
+    for disorder_name, source in disorders_sources.items()
 }
 
-# Faire une boucle du mapping (loop à travers liste 'anxiety', 'depressive', etc.)
+
+def warm_up(disorder_names=None):
+    """
+    Load every frame of the given disorders (all of them by default) and the population, e.g. before forking workers
+    """
+    for disorder_name in disorder_names or all_disorders_dataframes:
+        all_disorders_dataframes[disorder_name].warm_up()
+    get_population_index()
+
+
+@lru_cache(maxsize=None)
+def get_population_index():
+    """
+    Population by (Entity, Year), loaded once from the snapshot (or the anxiety by sex CSV file)
+    """
+    df_pop = load_frame('population', parse_population)
+    return df_pop.set_index(['Entity', 'Year'])['Population'].sort_index()
+
+
+def get_memory_report():
+    """
+    Memory used by every frame (strings included), loading them if needed, largest first
+    """
+    warm_up()
+    frames = {
+        f'{disorder_name}/{field}': getattr(disorder_df, field)
+        for disorder_name, disorder_df in all_disorders_dataframes.items()
+        for field in FRAME_FIELDS
+    }
+    frames['population'] = get_population_index().to_frame()
+
+    report = pd.DataFrame(
+        [
+            {'frame': key, 'rows': len(df), 'memory_kib': df.memory_usage(deep=True, index=True).sum() / 1024}
+            for key, df in frames.items() if df is not None
+        ]
+    ).sort_values('memory_kib', ascending=False, ignore_index=True)
+    return report.round(1)
+
+
+if __name__ == '__main__':
+    memory_report = get_memory_report()
+    print(memory_report.to_string(index=False))
+    print(f"Total: {memory_report['memory_kib'].sum() / 1024:.1f} MiB")
@@ -1,5 +1,5 @@
 import pandas as pd
-from utils.process_data import get_continent_name, country_code_to_continent_name
+from utils.continents import get_continents
 from utils.ga_utils import clean_duplicated_columns
 
 DATA_PATH = 'data/surveys'
@@ -9,7 +9,7 @@ def process_and_clean_survey_data():
 
     # APPROACHES WHEN DEALING WITH ANXIETY AND DEPRESSION PROCESSING
     approaches_df = pd.read_csv(f'{DATA_PATH}/dealing-with-anxiety-depression-approaches.csv')
-    approaches_df['Continent'] = approaches_df['Code'].apply(country_code_to_continent_name)
+    approaches_df['Continent'] = get_continents(approaches_df['Code'])
     approaches_df.rename(columns={
         'Share - Question: mh8b - Engaged in religious/spiritual activities when anxious/depressed - Answer: Yes - Gender: all - Age_group: all': 'Engaged in Religious or Spiritual Activities when Anxious or Depressed',
         'Share - Question: mh8e - Improved healthy lifestyle behaviors when anxious/depressed - Answer: Yes - Gender: all - Age_group: all': 'Improved Healthy Lifestyle Behaviors when Anxious or Depressed',
@@ -26,14 +26,14 @@ def process_and_clean_survey_data():
     discomfort_df.rename(columns={
         'Share - Question: mh5 - Someone local comfortable speaking about anxiety/depression with someone they know - Answer: Not at all comfortable - Gender: all - Age_group: all': 'Not Comfortable Discussing Anxiety/Depression with Acquaintances'
     }, inplace=True)
-    discomfort_df['Continent'] = discomfort_df['Code'].apply(country_code_to_continent_name)
+    discomfort_df['Continent'] = get_continents(discomfort_df['Code'])
 
     # FUND RESEARCH ON ANXIETY AND DEPRESSION PROCESSING
     fund_df = pd.read_csv(f'{DATA_PATH}/fund-research-anxiety-depression.csv')
     fund_df.rename(columns={
         'Share - Question: mh4b - Important for national government to fund research on anxiety/depression - Answer: Extremely important - Gender: all - Age_group: all': 'View on National Government Funding for Anxiety/Depression Research as Extremely Important'
     }, inplace=True)
-    fund_df['Continent'] = fund_df['Code'].apply(country_code_to_continent_name)
+    fund_df['Continent'] = get_continents(fund_df['Code'])
 
     fund_df = fund_df.dropna(subset=[
         'View on National Government Funding for Anxiety/Depression Research as Extremely Important',
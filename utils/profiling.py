@@ -0,0 +1,195 @@
+import functools
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+
+import dash
+import flask
+import pandas as pd
+from pandas.core.groupby import DataFrameGroupBy, SeriesGroupBy
+
+from utils.cache import all_caches
+
+# Opt-in instrumentation of the server-side callbacks, exposed in the Prometheus text format on /_metrics.
+# MH_PROFILING=1 enables it, and MH_PROFILING_SAMPLE_RATE is the share of callback calls which are measured: wall time,
+# request and response payload sizes, and time spent in the main pandas operations. Metrics are kept per worker process.
+PROFILING_ENABLED = os.environ.get('MH_PROFILING', '0') == '1'
+SAMPLE_RATE = float(os.environ.get('MH_PROFILING_SAMPLE_RATE', '0.1'))
+METRICS_ROUTE = '/_metrics'
+
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216]
+
+# pandas functions and methods whose duration is accounted as pandas time
+PANDAS_TIMED_METHODS = [
+    (pd, ['read_csv', 'concat']),
+    (pd.DataFrame, [
+        'query', 'merge', 'pivot', 'pivot_table', 'sort_values', 'apply', 'to_dict', 'drop_duplicates', 'dropna',
+        'nlargest', 'reindex'
+    ]),
+    (DataFrameGroupBy, ['mean', 'sum', 'max', 'min', 'apply', 'agg', 'transform', 'head', 'size']),
+    (SeriesGroupBy, ['mean', 'sum', 'max', 'min', 'apply', 'agg', 'transform']),
+]
+
+_state = threading.local()
+
+
+class Histogram:
+    def __init__(self, name, documentation, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._values = defaultdict(lambda: {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+
+    def observe(self, label, value):
+        with self._lock:
+            values = self._values[label]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    values['buckets'][i] += 1
+            values['sum'] += value
+            values['count'] += 1
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+    def reset_lock(self):
+        self._lock = threading.Lock()
+
+    def to_prometheus(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for label, values in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, values['buckets']):
+                    lines.append(f'{self.name}_bucket{{callback="{label}",le="{bound}"}} {count}')
+                lines.append(f'{self.name}_bucket{{callback="{label}",le="+Inf"}} {values["count"]}')
+                lines.append(f'{self.name}_sum{{callback="{label}"}} {values["sum"]}')
+                lines.append(f'{self.name}_count{{callback="{label}"}} {values["count"]}')
+        return lines
+
+
+callback_duration = Histogram(
+    'dash_callback_duration_seconds', 'Wall time of the callback, JSON serialization included', DURATION_BUCKETS
+)
+callback_pandas_duration = Histogram(
+    'dash_callback_pandas_seconds', 'Time spent in pandas operations during the callback', DURATION_BUCKETS
+)
+callback_request_size = Histogram(
+    'dash_callback_request_bytes', 'Size of the callback request payload', SIZE_BUCKETS
+)
+callback_response_size = Histogram(
+    'dash_callback_response_bytes', 'Size of the callback response payload', SIZE_BUCKETS
+)
+all_histograms = [callback_duration, callback_pandas_duration, callback_request_size, callback_response_size]
+
+
+def reset_metrics():
+    for histogram in all_histograms:
+        histogram.reset()
+
+
+def reset_after_fork():
+    """
+    Start the worker with its own locks, metrics and sampling sequence (the random state is copied by fork)
+    """
+    for histogram in all_histograms:
+        histogram.reset_lock()
+    reset_metrics()
+    random.seed()
+
+
+def _time_pandas(method):
+    # DataFrame.query resolves the @variables in the frames of its callers: skip the frame of the wrapper
+    adds_frame_level = method.__name__ == 'query'
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        if adds_frame_level:
+            kwargs['level'] = kwargs.get('level', 0) + 1
+
+        # Only measured within a sampled callback, and not for pandas calls nested in another timed call
+        if not getattr(_state, 'active', False) or _state.depth:
+            return method(*args, **kwargs)
+
+        _state.depth += 1
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            _state.pandas_seconds += time.perf_counter() - start
+            _state.depth -= 1
+
+    return wrapper
+
+
+def _patch_pandas():
+    for owner, method_names in PANDAS_TIMED_METHODS:
+        for method_name in method_names:
+            setattr(owner, method_name, _time_pandas(getattr(owner, method_name)))
+
+
+def _profile_callback(func):
+    label = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if random.random() >= SAMPLE_RATE:
+            return func(*args, **kwargs)
+
+        _state.active, _state.depth, _state.pandas_seconds = True, 0, 0.0
+        start = time.perf_counter()
+        response = None
+        try:
+            response = func(*args, **kwargs)
+            return response
+        finally:
+            callback_duration.observe(label, time.perf_counter() - start)
+            callback_pandas_duration.observe(label, _state.pandas_seconds)
+            _state.active = False
+            if flask.has_request_context():
+                callback_request_size.observe(label, flask.request.content_length or 0)
+            if isinstance(response, str):
+                callback_response_size.observe(label, len(response))
+
+    return wrapper
+
+
+def _caches_to_prometheus():
+    lines = []
+    for metric in ['hits', 'misses', 'evictions', 'build_seconds']:
+        name = f'cache_{metric}_total'
+        lines.append(f'# TYPE {name} counter')
+        lines.extend(f'{name}{{cache="{cache.name}"}} {cache.metrics()[metric]}' for cache in all_caches.values())
+    lines.append('# TYPE cache_size gauge')
+    lines.extend(f'cache_size{{cache="{cache.name}"}} {cache.metrics()["size"]}' for cache in all_caches.values())
+    return lines
+
+
+def metrics_to_prometheus():
+    lines = [line for histogram in all_histograms for line in histogram.to_prometheus()]
+    return '\n'.join(lines + _caches_to_prometheus()) + '\n'
+
+
+def instrument_app(app):
+    """
+    Wrap every server-side callback registered so far (app.callback and dash.callback in pages/*.py) and add the
+    /_metrics route to app.server. Does nothing unless MH_PROFILING=1.
+    """
+    if not PROFILING_ENABLED:
+        return
+
+    # Callbacks registered with dash.callback are only moved to app.callback_map on the first request
+    for callback_map in [app.callback_map, dash._callback.GLOBAL_CALLBACK_MAP]:
+        for callback_spec in callback_map.values():
+            if 'callback' in callback_spec:
+                callback_spec['callback'] = _profile_callback(callback_spec['callback'])
+
+    _patch_pandas()
+
+    @app.server.route(METRICS_ROUTE)
+    def metrics():
+        return flask.Response(metrics_to_prometheus(), mimetype='text/plain; version=0.0.4')
@@ -1,6 +1,7 @@
 import plotly.express as px
 import pandas as pd
 from plotly import colors
+from utils import figure_builder
 from utils.utils_config import BG_TRANSPARENT, HOVERLABEL_TEMPLATE
 
 
@@ -19,7 +20,8 @@ def create_bar_fig(
         r_padding: int = 0
 ):
 
-    fig = px.bar(
+    bar = figure_builder.bar if figure_builder.FAST_FIGURES else px.bar
+    fig = bar(
         df,
         x=y,
         y=x,
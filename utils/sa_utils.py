@@ -1,10 +1,38 @@
 import pandas as pd
+from collections import namedtuple
 
-
-def filter_on_continent(df, continent):
-    return df.query("Continent == @continent")
+# Rates of a survey question for a continent: rate of the continent itself, rates of its countries and rates of the
+# income levels, both sorted by ascending rate (the order of the bars)
+SurveySlice = namedtuple('SurveySlice', ['continent_rate', 'country_rates', 'income_rates'])
 
 
 def filter_on_entity(df, entity):
     return df.query("Entity in @entity")
 
+
+def sort_rates(df, question):
+    return df[['Entity', question]].sort_values(question, kind='stable').reset_index(drop=True)
+
+
+def build_survey_index(df: pd.DataFrame, questions: list, continents: list, income_levels: list) -> dict:
+    """
+    SurveySlice of every (question, continent), computed once from the survey data so that the callbacks only have
+    to look them up
+    """
+    survey_index = {}
+    countries_by_continent = dict(tuple(df.groupby('Continent', sort=False)))
+    survey_incomes = filter_on_entity(df, income_levels)
+    # Continents are also entities of the survey data, with the rate of the whole continent
+    first_rows = df.drop_duplicates(subset='Entity').set_index('Entity')
+
+    for question in questions:
+        income_rates = sort_rates(survey_incomes, question)
+
+        for continent in continents:
+            survey_index[(question, continent)] = SurveySlice(
+                continent_rate=first_rows.at[continent, question],
+                country_rates=sort_rates(countries_by_continent[continent], question),
+                income_rates=income_rates
+            )
+
+    return survey_index